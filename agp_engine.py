@@ -0,0 +1,143 @@
+# ✅ Ambulatory Glucose Profile (AGP) engine
+# -------------------------------------------------------
+# Readings are binned by minute-of-day and the 5/25/50/75/95 percentile
+# bands are computed for every bin at once: one sort groups each bin's
+# values into a contiguous segment, and the percentile positions inside each
+# segment are computed with array arithmetic (no per-bin loop).
+# The binned profile (288 rows at 5-minute bins) is what gets stored and
+# charted, instead of thousands of raw points.
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+PERCENTILES = (5, 25, 50, 75, 95)
+DEFAULT_BIN_MINUTES = 5
+# Profiles (~288 rows each) held in memory per process
+MAX_PROFILES = int(os.getenv("AGP_STORE_MAX_PROFILES", "512"))
+
+
+def compute_agp(minutes, values, bin_minutes=DEFAULT_BIN_MINUTES, percentiles=PERCENTILES):
+    """
+    Percentile bands by time of day.
+    `minutes` are absolute minute timestamps (epoch or day-offset); only the
+    minute-of-day is used. Returns a dict of equal-length arrays:
+    minute_of_day, count and one "p<q>" array per percentile (NaN for empty bins).
+    """
+    minutes = np.asarray(minutes, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    keep = ~np.isnan(values)
+    minutes, values = minutes[keep], values[keep]
+
+    n_bins = 1440 // bin_minutes
+    bins = (minutes % 1440) // bin_minutes
+
+    order = np.lexsort((values, bins))
+    sorted_values = values[order]
+    counts = np.bincount(bins, minlength=n_bins)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    profile = {
+        "minute_of_day": np.arange(n_bins, dtype=np.int64) * bin_minutes,
+        "count": counts,
+    }
+    filled = counts > 0
+    for q in percentiles:
+        # Linear interpolation between closest ranks, as np.percentile does
+        pos = starts + (counts - 1).clip(min=0) * (q / 100)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, starts + counts - 1)
+        frac = pos - lo
+        band = np.full(n_bins, np.nan)
+        if sorted_values.size:
+            lo_v = sorted_values[lo[filled]]
+            hi_v = sorted_values[np.maximum(hi[filled], lo[filled])]
+            band[filled] = lo_v + (hi_v - lo_v) * frac[filled]
+        profile[f"p{q}"] = band
+    return profile
+
+
+def profile_to_rows(profile):
+    """List of row dicts ready for a DataFrame or a Firestore document"""
+    keys = list(profile.keys())
+    columns = [profile[k].tolist() for k in keys]
+    rows = []
+    for values in zip(*columns):
+        row = dict(zip(keys, values))
+        for k, v in row.items():
+            if isinstance(v, float) and v != v:
+                row[k] = None
+        rows.append(row)
+    return rows
+
+
+class AGPStore:
+    """
+    Per-user, per-period AGP profiles, kept in memory and optionally in Firestore.
+    At most `max_profiles` stay in memory (least recently used evicted first).
+    Periods that other processes have made obsolete are never asked for
+    again, so they age out the same way.
+    """
+
+    def __init__(self, db=None, max_profiles=MAX_PROFILES):
+        self.db = db
+        self.max_profiles = max_profiles
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key, rows):
+        """Insert as most recently used (call with the lock held)"""
+        self._profiles[key] = rows
+        self._profiles.move_to_end(key)
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+
+    @staticmethod
+    def period_key(start_date, end_date):
+        return f"{start_date}_{end_date}"
+
+    def _doc(self, user_id, period):
+        return self.db.collection("users").document(user_id).collection("agp").document(period)
+
+    def get(self, user_id, period):
+        """Stored rows for this user/period, or None"""
+        key = (user_id, period)
+        with self._lock:
+            rows = self._profiles.get(key)
+            if rows is not None:
+                self._profiles.move_to_end(key)
+        if rows is None and self.db is not None:
+            doc = self._doc(user_id, period).get()
+            if doc.exists:
+                rows = doc.to_dict().get("rows")
+                with self._lock:
+                    self._remember(key, rows)
+        return rows
+
+    def put(self, user_id, period, rows):
+        with self._lock:
+            self._remember((user_id, period), rows)
+        if self.db is not None:
+            self._doc(user_id, period).set({"rows": rows})
+
+    def get_or_compute(self, user_id, period, minutes, values, bin_minutes=DEFAULT_BIN_MINUTES):
+        """Return stored rows, computing and storing them on first request"""
+        rows = self.get(user_id, period)
+        if rows is None:
+            rows = profile_to_rows(compute_agp(minutes, values, bin_minutes))
+            self.put(user_id, period, rows)
+        return rows
+
+    def invalidate(self, user_id, period=None):
+        """Drop cached profiles after new readings land for this user"""
+        with self._lock:
+            for key in [k for k in self._profiles if k[0] == user_id and (period is None or k[1] == period)]:
+                del self._profiles[key]
+        if self.db is not None:
+            if period is not None:
+                self._doc(user_id, period).delete()
+            else:
+                for doc in self.db.collection("users").document(user_id).collection("agp").stream():
+                    doc.reference.delete()
@@ -0,0 +1,217 @@
+# ✅ Content-addressed cache for /analyze results
+# -------------------------------------------------------
+# Results are keyed by a hash of the normalized readings, bodyweight, goal,
+# meals and the current rule thresholds, and stored as pre-serialized JSON.
+# Tier 1 is an in-process LRU; tier 2 is a directory shared by every uvicorn
+# worker on the box. The rules fingerprint covers the glucose_engine
+# thresholds, RESULT_VERSION and the source of every module that computes a
+# result, so a deploy that changes any of them makes old entries stop matching. The disk tier is pruned
+# every PRUNE_EVERY writes: files unused for DISK_TTL_SECONDS go first, then
+# the least recently used until at most DISK_ENTRIES remain (hits refresh a
+# file's mtime).
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import cgm_resample
+import glucose_engine
+import glycemic_metrics
+import meal_attribution
+import spike_detector
+
+CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", ".analysis_cache")
+MEMORY_ENTRIES = 1024
+DISK_ENTRIES = int(os.getenv("ANALYSIS_CACHE_DISK_ENTRIES", "20000"))
+DISK_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 86400)))
+PRUNE_EVERY = 256
+# Bump when a result changes for a reason the fingerprint can't see (e.g. a dependency upgrade)
+RESULT_VERSION = 2
+# Modules whose code shapes an analysis result
+RESULT_MODULES = (glucose_engine, glycemic_metrics, cgm_resample, meal_attribution, spike_detector)
+
+
+def _source_hash(modules):
+    h = hashlib.blake2b(digest_size=8)
+    for module in modules:
+        with open(module.__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+# Source only changes on deploy, so it is hashed once per process
+_SOURCE_HASH = _source_hash(RESULT_MODULES)
+
+
+def rules_fingerprint():
+    """Hash of every threshold, and of the code, that influences an analysis result"""
+    rules = {
+        "low": glucose_engine.LOW_THRESHOLD,
+        "high": glucose_engine.HIGH_THRESHOLD,
+        "spike_delta": glucose_engine.SPIKE_DELTA,
+        "spike_window": glucose_engine.SPIKE_WINDOW_MINUTES,
+        "cgm_stride": glucose_engine.CGM_MAX_STRIDE_MINUTES,
+        "goal_factors": glucose_engine.GOAL_CALORIE_FACTORS,
+        "kcal_per_kg": glucose_engine.MAINTENANCE_KCAL_PER_KG,
+        "resample_step": cgm_resample.DEFAULT_STEP,
+        "resample_max_gap": cgm_resample.DEFAULT_MAX_GAP,
+        "meal_window": meal_attribution.DEFAULT_WINDOW_MINUTES,
+        "version": RESULT_VERSION,
+        "source": _SOURCE_HASH,
+    }
+    return hashlib.blake2b(json.dumps(rules, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+
+def analysis_key(readings, bodyweight_kg, goal, meals=None):
+    """Content hash of a normalized /analyze request"""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(rules_fingerprint().encode())
+    h.update("\x1f".join(r["time"].strip() for r in readings).encode())
+    h.update(np.fromiter((r["glucose"] for r in readings), dtype=np.float64, count=len(readings)).tobytes())
+    h.update(f"|{float(bodyweight_kg)!r}|{goal}|".encode())
+    if meals is not None:
+        h.update(json.dumps(meals, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    """Two-tier (memory LRU + shared disk) store of serialized analysis results"""
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES,
+                 disk_ttl=DISK_TTL_SECONDS, clock=time.time):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.disk_ttl = disk_ttl
+        self._clock = clock
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evicted_disk = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.prune()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remember(self, key, body):
+        with self._lock:
+            self._memory[key] = body
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Serialized result bytes, or None"""
+        with self._lock:
+            body = self._memory.get(key)
+            if body is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return body
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    if self._clock() - os.fstat(f.fileno()).st_mtime > self.disk_ttl:
+                        body = None
+                    else:
+                        body = f.read()
+                if body is not None:
+                    # Mark as recently used for pruning
+                    os.utime(path)
+            except FileNotFoundError:
+                body = None
+            if body is not None:
+                self._remember(key, body)
+                with self._lock:
+                    self.hits_disk += 1
+                return body
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, result):
+        """Serialize once and store in both tiers; returns the bytes"""
+        body = json.dumps(result).encode()
+        self._remember(key, body)
+        if self.cache_dir:
+            # Write-then-rename so other workers never read a partial file
+            tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, self._path(key))
+            with self._lock:
+                self._writes += 1
+                due = self._writes % PRUNE_EVERY == 0
+            if due:
+                self.prune()
+        return body
+
+    def prune(self):
+        """Drop expired disk entries, then the least recently used beyond `disk_entries`"""
+        if not self.cache_dir:
+            return 0
+        now = self._clock()
+        entries = []
+        removed = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith((".json", ".tmp")):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                # Temp files are only left behind by a worker that died mid-write
+                if now - mtime > self.disk_ttl or (entry.name.endswith(".tmp") and now - mtime > 60):
+                    removed += self._remove(entry.path)
+                elif entry.name.endswith(".json"):
+                    entries.append((mtime, entry.path))
+        if len(entries) > self.disk_entries:
+            entries.sort()
+            for _, path in entries[:len(entries) - self.disk_entries]:
+                removed += self._remove(path)
+        with self._lock:
+            self.evicted_disk += removed
+        return removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return 1
+
+    def invalidate(self):
+        """Drop every entry (e.g. after editing thresholds without a restart)"""
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".json"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except FileNotFoundError:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "evicted_disk": self.evicted_disk,
+                "rules": rules_fingerprint(),
+            }
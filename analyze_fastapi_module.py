@@ -0,0 +1,84 @@
+print("🔥 analyze_fastapi_module is loading...")
+
+import zlib
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import BaseModel
+
+from analysis_cache import AnalysisCache, analysis_key
+from batch_analysis import analyze_batch, shutdown_pool, start_pool
+from glucose_engine import analyze_readings
+from glucose_stream import ingest_ndjson_stream
+
+# ✅ FastAPI router setup (mount next to auth_fastapi_module.router)
+router = APIRouter()
+
+# ✅ Result cache shared by all workers through ANALYSIS_CACHE_DIR
+analysis_cache = AnalysisCache()
+
+# ✅ Pydantic models
+class GlucoseReading(BaseModel):
+    time: str
+    glucose: float
+
+class Meal(BaseModel):
+    time: str
+    description: str = ""
+
+class AnalyzeRequest(BaseModel):
+    glucose_readings: List[GlucoseReading]
+    bodyweight_kg: float
+    goal: str = "maintain"
+    meals: Optional[List[Meal]] = None
+
+class BatchEntry(AnalyzeRequest):
+    user_id: str
+
+class BatchAnalyzeRequest(BaseModel):
+    users: List[BatchEntry]
+
+# ✅ Routes
+@router.post("/analyze")
+def analyze(payload: AnalyzeRequest):
+    readings = [r.model_dump() for r in payload.glucose_readings]
+    meals = [m.model_dump() for m in payload.meals] if payload.meals is not None else None
+    key = analysis_key(readings, payload.bodyweight_kg, payload.goal, meals)
+    body = analysis_cache.get(key)
+    if body is None:
+        try:
+            result = analyze_readings(readings, payload.bodyweight_kg, payload.goal, meals)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        body = analysis_cache.put(key, result)
+    return Response(content=body, media_type="application/json")
+
+@router.get("/analyze/cache")
+def cache_stats():
+    return analysis_cache.stats()
+
+@router.post("/analyze/batch")
+def analyze_many(payload: BatchAnalyzeRequest):
+    user_ids = [u.user_id for u in payload.users]
+    if len(set(user_ids)) != len(user_ids):
+        raise HTTPException(status_code=400, detail="Duplicate user_id in batch")
+    return analyze_batch([u.model_dump() for u in payload.users])
+
+@router.post("/analyze/stream")
+async def analyze_stream(request: Request, bodyweight_kg: Optional[float] = None, goal: str = "maintain"):
+    """NDJSON body, one {"time", "glucose"} per line; send Content-Encoding: gzip for compressed uploads"""
+    gzipped = "gzip" in request.headers.get("content-encoding", "").lower()
+    try:
+        stats = await ingest_ndjson_stream(request.stream(), gzipped=gzipped)
+    except (ValueError, zlib.error) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return stats.summary(bodyweight_kg, goal)
+
+@router.on_event("startup")
+def start_batch_pool():
+    # Started before requests arrive, from the main thread
+    start_pool()
+
+@router.on_event("shutdown")
+def stop_batch_pool():
+    shutdown_pool()
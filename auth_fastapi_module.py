@@ -7,10 +7,12 @@ from passlib.context import CryptContext
 import firebase_admin
 from firebase_admin import credentials, firestore
 import os
+from repository import STORAGE_BACKEND, open_repository
+from user_cache import UserCache
 
 # ✅ Safe Firebase Initialization (with error handling & logging)
 try:
-    if not firebase_admin._apps:
+    if STORAGE_BACKEND == "firestore" and not firebase_admin._apps:
         if not os.path.exists("firebase_key.json"):
             raise FileNotFoundError("❌ firebase_key.json not found. Make sure it's uploaded and the path is correct.")
 
@@ -22,17 +24,23 @@ except Exception as e:
     print("❌ Firebase init failed:", e)
 
 # ✅ Initialize Firestore DB client safely
-try:
-    db = firestore.client()
-    users_ref = db.collection("users")
-except ValueError as e:
-    print("❌ Firestore client could not be initialized. Check Firebase init status.")
-    db = None
-    users_ref = None
+db = None
+if STORAGE_BACKEND == "firestore":
+    try:
+        db = firestore.client()
+    except ValueError as e:
+        print("❌ Firestore client could not be initialized. Check Firebase init status.")
+
+# ✅ Storage repository (Firestore or embedded SQLite, see STORAGE_BACKEND)
+repo = open_repository(STORAGE_BACKEND, db=db)
+print(f"🗄️ Storage backend: {STORAGE_BACKEND}")
 
 # ✅ FastAPI router setup
 router = APIRouter()
 
+# ✅ In-process cache of user documents (read-through, invalidated on writes)
+user_cache = UserCache()
+
 # ✅ Password hashing configuration
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
@@ -57,15 +65,18 @@ def get_password_hash(password):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+# ✅ User document lookup (through the cache)
+def get_user(username: str):
+    return user_cache.get(username, repo.get_user)
+
 # ✅ Authentication helper
 def authenticate_user(username: str, password: str):
-    if users_ref is None:
+    if repo is None:
         raise HTTPException(status_code=503, detail="Database not initialized.")
 
-    user_doc = users_ref.document(username).get()
-    if not user_doc.exists:
+    user_data = get_user(username)
+    if user_data is None:
         return False
-    user_data = user_doc.to_dict()
     if not verify_password(password, user_data['hashed_password']):
         return False
     return user_data
@@ -73,17 +84,23 @@ def authenticate_user(username: str, password: str):
 # ✅ Routes
 @router.post("/signup", response_model=User)
 def signup(user: UserCreate):
-    if users_ref is None:
+    if repo is None:
         raise HTTPException(status_code=503, detail="Database not available.")
 
-    if users_ref.document(user.username).get().exists:
+    if get_user(user.username) is not None:
         raise HTTPException(status_code=400, detail="Username already exists")
-    users_ref.document(user.username).set({
+    user_data = {
         "username": user.username,
         "full_name": user.full_name,
         "email": user.email,
         "hashed_password": get_password_hash(user.password),
-    })
+    }
+    if not repo.create_user(user_data):
+        # Lost a race with another signup for the same name
+        user_cache.invalidate(user.username)
+        raise HTTPException(status_code=400, detail="Username already exists")
+    # Replaces the cached "missing" entry from the check above
+    user_cache.put(user.username, user_data)
     return User(username=user.username, full_name=user.full_name, email=user.email)
 
 @router.post("/token", response_model=Token)
@@ -98,11 +115,11 @@ def read_profile(current_user: dict = Depends(lambda token: get_current_user(tok
     return current_user
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
-    if users_ref is None:
+    if repo is None:
         raise HTTPException(status_code=503, detail="Database not available.")
 
-    user_doc = users_ref.document(token).get()
-    if not user_doc.exists:
+    user_data = get_user(token)
+    if user_data is None:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    return user_doc.to_dict()
+    return user_data
 
@@ -0,0 +1,120 @@
+# ✅ Process-pool fan-out for multi-user glucose analysis
+# -------------------------------------------------------
+# Coach dashboards analyse hundreds of athletes at once. Payloads are split
+# into one shard per worker process, each shard is analysed with the
+# vectorized engine, and per-shard timings are reported back.
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from glucose_engine import analyze_readings
+
+# Below this many users the pickling overhead outweighs the extra cores
+INLINE_BATCH_SIZE = 8
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _start_method():
+    # The server is multithreaded: a forked child could inherit locks held by
+    # other threads (BLAS, logging, the analysis cache) and deadlock
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def get_pool():
+    """Shared process pool, created on first use (or by start_pool at startup)"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            _pool_workers = os.cpu_count() or 1
+            _pool = ProcessPoolExecutor(
+                max_workers=_pool_workers, mp_context=multiprocessing.get_context(_start_method())
+            )
+        return _pool
+
+
+def start_pool():
+    """Create the pool up front (call from the app's startup hook)"""
+    get_pool()
+
+
+def shutdown_pool():
+    """Stop the worker processes (call from the app's shutdown hook)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _analyze_user(entry):
+    try:
+        result = analyze_readings(
+            entry["glucose_readings"], entry["bodyweight_kg"], entry.get("goal", "maintain"), entry.get("meals")
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return {"error": str(e)}
+    return result
+
+
+def _analyze_shard(shard_id, entries):
+    """Worker entry point: analyse one shard and time it"""
+    start = time.perf_counter()
+    results = [(entry["user_id"], _analyze_user(entry)) for entry in entries]
+    timing = {
+        "shard": shard_id,
+        "users": len(entries),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        "pid": os.getpid(),
+    }
+    return results, timing
+
+
+def make_shards(entries, n_shards):
+    """Split entries into n_shards contiguous shards balanced by reading count"""
+    n_shards = max(1, min(n_shards, len(entries)))
+    sizes = [len(e.get("glucose_readings", ())) + 1 for e in entries]
+    target = sum(sizes) / n_shards
+    shards, current, load = [], [], 0
+    for entry, size in zip(entries, sizes):
+        current.append(entry)
+        load += size
+        if load >= target and len(shards) < n_shards - 1:
+            shards.append(current)
+            current, load = [], 0
+    if current:
+        shards.append(current)
+    return shards
+
+
+def analyze_batch(entries, max_shards=None):
+    """
+    Analyse many users' payloads.
+    Each entry is {"user_id", "glucose_readings", "bodyweight_kg", "goal"}.
+    Returns {"results": {user_id: result}, "shards": [...], "elapsed_ms": float}.
+    """
+    start = time.perf_counter()
+    if len(entries) <= INLINE_BATCH_SIZE:
+        outputs = [_analyze_shard(0, entries)] if entries else []
+    else:
+        pool = get_pool()
+        shards = make_shards(entries, max_shards or _pool_workers)
+        futures = [pool.submit(_analyze_shard, i, shard) for i, shard in enumerate(shards)]
+        outputs = [f.result() for f in futures]
+
+    results = {}
+    timings = []
+    for shard_results, timing in outputs:
+        results.update(shard_results)
+        timings.append(timing)
+
+    return {
+        "results": results,
+        "shards": timings,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
@@ -0,0 +1,182 @@
+# ✅ Partitioned Parquet archive for long-term CGM and WHOOP history
+# -------------------------------------------------------
+# Layout (hive-style, so readers can prune partitions):
+#   {root}/cgm/user_id=<id>/month=YYYY-MM/part-*.parquet
+#   {root}/whoop/user_id=<id>/month=YYYY-MM/part-*.parquet
+# Every file uses the fixed Arrow schemas below. Reads go through
+# pyarrow.dataset with filters, so only the needed months, users and
+# columns are touched. compact() merges the small daily files a partition
+# accumulates into one sorted file.
+
+import os
+import uuid
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+ARCHIVE_DIR = os.getenv("CGM_ARCHIVE_DIR", "cgm_archive")
+
+CGM_SCHEMA = pa.schema([
+    ("time", pa.timestamp("s", tz="UTC")),
+    ("glucose", pa.uint16()),
+    ("source", pa.dictionary(pa.int8(), pa.string())),
+])
+
+WHOOP_SCHEMA = pa.schema([
+    ("date", pa.date32()),
+    ("strain", pa.float32()),
+    ("recovery", pa.float32()),
+    ("sleep_hours", pa.float32()),
+])
+
+SCHEMAS = {"cgm": CGM_SCHEMA, "whoop": WHOOP_SCHEMA}
+SORT_KEYS = {"cgm": "time", "whoop": "date"}
+PARTITIONING = ds.partitioning(pa.schema([("user_id", pa.string()), ("month", pa.string())]), flavor="hive")
+
+
+def _write_atomic(table, directory):
+    """Write a new part file; the dot-prefixed temp name is ignored by dataset readers"""
+    name = f"part-{uuid.uuid4().hex}.parquet"
+    tmp = os.path.join(directory, f".{name}.tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    path = os.path.join(directory, name)
+    os.replace(tmp, path)
+    return path
+
+
+class CGMArchive:
+    """Writer/reader for the per-user, per-month Parquet archive"""
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+
+    def _partition_dir(self, kind, user_id, month):
+        return os.path.join(self.root, kind, f"user_id={quote(user_id, safe='')}", f"month={month}")
+
+    def _write_partitions(self, kind, user_id, table, months):
+        written = []
+        for month in np.unique(months).tolist():
+            part = table.filter(pa.array(months == month))
+            directory = self._partition_dir(kind, user_id, month)
+            os.makedirs(directory, exist_ok=True)
+            written.append(_write_atomic(part, directory))
+        return written
+
+    # ✅ Writers
+    def write_cgm(self, user_id, times, values, source="cgm"):
+        """Archive readings (epoch seconds, mg/dL); one new file per touched month"""
+        times = np.asarray(times, dtype=np.int64)
+        if times.size == 0:
+            return []
+        table = pa.table({
+            "time": pa.array(times, type=pa.timestamp("s", tz="UTC")),
+            "glucose": pa.array(np.asarray(values), type=pa.uint16()),
+            "source": pa.array([source] * times.size).dictionary_encode().cast(CGM_SCHEMA.field("source").type),
+        }, schema=CGM_SCHEMA)
+        months = np.datetime_as_string(times.astype("datetime64[s]"), unit="M")
+        return self._write_partitions("cgm", user_id, table, months)
+
+    def write_series(self, user_id, series, source="cgm"):
+        return self.write_cgm(user_id, series.times, series.values, source)
+
+    def write_whoop(self, user_id, records):
+        """Archive daily WHOOP rows: [{"date": "YYYY-MM-DD", "strain", "recovery", "sleep_hours"}]"""
+        if not records:
+            return []
+        dates = np.array([r["date"] for r in records], dtype="datetime64[D]")
+        table = pa.table({
+            "date": pa.array(dates, type=pa.date32()),
+            "strain": pa.array([r.get("strain") for r in records], type=pa.float32()),
+            "recovery": pa.array([r.get("recovery") for r in records], type=pa.float32()),
+            "sleep_hours": pa.array([r.get("sleep_hours") for r in records], type=pa.float32()),
+        }, schema=WHOOP_SCHEMA)
+        months = np.datetime_as_string(dates, unit="M")
+        return self._write_partitions("whoop", user_id, table, months)
+
+    # ✅ Readers
+    def dataset(self, kind):
+        return ds.dataset(
+            os.path.join(self.root, kind), format="parquet",
+            schema=SCHEMAS[kind].append(pa.field("user_id", pa.string())).append(pa.field("month", pa.string())),
+            partitioning=PARTITIONING,
+        )
+
+    def read(self, kind, user_ids=None, start_month=None, end_month=None, columns=None, extra_filter=None):
+        """
+        Arrow table for the given users and inclusive month range ("YYYY-MM").
+        Partition filters prune whole directories; `extra_filter` (a
+        pyarrow.dataset expression) is pushed down to the Parquet row groups.
+        """
+        if not os.path.isdir(os.path.join(self.root, kind)):
+            schema = SCHEMAS[kind]
+            if columns:
+                schema = pa.schema([schema.field(c) for c in columns if c in schema.names])
+            return schema.empty_table()
+        expr = None
+
+        def _and(e):
+            return e if expr is None else expr & e
+
+        if user_ids is not None:
+            expr = _and(ds.field("user_id").isin(list(user_ids)))
+        if start_month is not None:
+            expr = _and(ds.field("month") >= start_month)
+        if end_month is not None:
+            expr = _and(ds.field("month") <= end_month)
+        if extra_filter is not None:
+            expr = _and(extra_filter)
+        return self.dataset(kind).to_table(columns=columns, filter=expr)
+
+    def read_cgm(self, user_id, start_month=None, end_month=None, columns=("time", "glucose")):
+        return self.read("cgm", [user_id], start_month, end_month, list(columns))
+
+    def read_whoop(self, user_id, start_month=None, end_month=None, columns=("date", "strain", "recovery", "sleep_hours")):
+        return self.read("whoop", [user_id], start_month, end_month, list(columns))
+
+    # ✅ Compaction
+    def compact_partition(self, kind, user_id, month):
+        """Merge a partition's files into one, sorted and de-duplicated on its time column"""
+        directory = self._partition_dir(kind, user_id, month)
+        paths = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".parquet")]
+        if len(paths) < 2:
+            return False
+        # Oldest first, so the stable sort below keeps the newest duplicate last
+        paths.sort(key=os.path.getmtime)
+        table = pa.concat_tables([pq.read_table(p, schema=SCHEMAS[kind]) for p in paths])
+        key = SORT_KEYS[kind]
+        table = table.sort_by(key)
+        # Keep the last row written for each timestamp
+        stamps = table.column(key)
+        if len(stamps) > 1:
+            same_as_next = pc.equal(stamps.slice(0, len(stamps) - 1), stamps.slice(1))
+            keep = pa.concat_arrays([pc.invert(same_as_next.combine_chunks()), pa.array([True])])
+            table = table.filter(keep)
+
+        _write_atomic(table, directory)
+        for p in paths:
+            os.remove(p)
+        return True
+
+    def compact(self, kind="cgm", min_files=2):
+        """Compaction job: merge every partition that has at least `min_files` files"""
+        merged = 0
+        base = os.path.join(self.root, kind)
+        if not os.path.isdir(base):
+            return merged
+        for user_dir in os.listdir(base):
+            for month_dir in os.listdir(os.path.join(base, user_dir)):
+                directory = os.path.join(base, user_dir, month_dir)
+                n_files = sum(f.endswith(".parquet") for f in os.listdir(directory))
+                if n_files >= min_files:
+                    user_id = unquote(user_dir.split("=", 1)[1])
+                    month = month_dir.split("=", 1)[1]
+                    merged += self.compact_partition(kind, user_id, month)
+        return merged
+
+
+if __name__ == "__main__":
+    print("🗜️ Compacted partitions:", {kind: CGMArchive().compact(kind) for kind in SCHEMAS})
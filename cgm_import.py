@@ -0,0 +1,228 @@
+# ✅ Bulk importer for Dexcom Clarity and LibreView CSV exports
+# -------------------------------------------------------
+# The export layout is recognised from its header, then the file is parsed
+# in pandas chunks with vectorized datetime and number conversion. The
+# "Low"/"High" (Dexcom) and "LO"/"HI" (Libre) sentinels are mapped to the
+# sensor's reporting limits. Parsed readings go straight into the
+# ReadingStore. Export timestamps are local wall-clock times and are stored
+# as naive epoch seconds, the same convention as the HH:MM inputs. With a
+# DedupIndex, readings already imported from the same sensor are dropped
+# before the write, so re-importing an overlapping export is a no-op.
+# Readings the store added can also be folded into the Firestore daily
+# rollups (daily_rollup.py).
+
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+
+import daily_rollup
+from glucose_series import GlucoseSeries
+
+CHUNK_ROWS = 10000
+MMOL_TO_MGDL = 18.016
+
+# Reporting limits used for out-of-range sentinels (mg/dL)
+DEXCOM_SENTINELS = {"LOW": 40, "HIGH": 400}
+LIBRE_SENTINELS = {"LO": 40, "HI": 500, "LOW": 40, "HIGH": 500}
+
+
+def _find(columns, prefix):
+    for c in columns:
+        if c.strip().lower().startswith(prefix.lower()):
+            return c
+    return None
+
+
+def detect_format(first_line, second_line=""):
+    """Return ("dexcom" | "libreview", header_columns) for an export, or raise ValueError"""
+    first = next(csv.reader([first_line]), [])
+    if _find(first, "Timestamp (") and _find(first, "Glucose Value") and _find(first, "Event Type"):
+        return "dexcom", first
+    # LibreView starts with a "Glucose Data,Generated on,..." title row
+    for candidate in (first, next(csv.reader([second_line]), [])):
+        if _find(candidate, "Device Timestamp") and _find(candidate, "Historic Glucose"):
+            return "libreview", candidate
+    raise ValueError("Unrecognised export: expected a Dexcom Clarity or LibreView CSV")
+
+
+def _to_mgdl(raw, sentinels, mmol):
+    """Vectorized value conversion; returns (mg/dL float array, low mask, high mask)"""
+    text = raw.astype("string").str.strip().str.upper()
+    low = text.isin([k for k, v in sentinels.items() if v <= 40]).to_numpy(dtype=bool)
+    high = text.isin([k for k, v in sentinels.items() if v > 40]).to_numpy(dtype=bool)
+    values = pd.to_numeric(text.str.replace(",", ".", regex=False), errors="coerce").to_numpy(dtype=np.float64)
+    if mmol:
+        values = values * MMOL_TO_MGDL
+    values[low] = min(v for v in sentinels.values())
+    values[high] = max(v for v in sentinels.values())
+    return values, low, high
+
+
+def _parse_dexcom_chunk(chunk, cols):
+    egv = chunk[cols["event"]].astype("string").str.strip().str.upper() == "EGV"
+    chunk = chunk[egv.fillna(False).to_numpy(dtype=bool)]
+    stamps = pd.to_datetime(chunk[cols["time"]], format="ISO8601", errors="coerce")
+    values, low, high = _to_mgdl(chunk[cols["value"]], DEXCOM_SENTINELS, cols["mmol"])
+    return stamps, values, low, high, _sensor_ids(chunk, cols, "dexcom")
+
+
+def _sensor_ids(chunk, cols, default):
+    """Per-row sensor id (transmitter / serial number), falling back to the export format"""
+    if cols.get("sensor") is None:
+        return np.full(len(chunk), default, dtype=object)
+    return chunk[cols["sensor"]].astype("string").str.strip().fillna(default).replace("", default).to_numpy(dtype=object)
+
+
+def _parse_libre_chunk(chunk, cols, state):
+    kinds = pd.to_numeric(chunk[cols["type"]], errors="coerce").to_numpy()
+    wanted = (kinds == 0) | ((kinds == 1) & state["include_scans"])
+    chunk = chunk[wanted]
+    kinds = kinds[wanted]
+    raw_times = chunk[cols["time"]]
+    if state.get("date_format") is None and len(raw_times):
+        # Export locale decides MM-DD vs DD-MM; settle it once on the first rows
+        us = pd.to_datetime(raw_times, format="%m-%d-%Y %H:%M", errors="coerce")
+        state["date_format"] = "%m-%d-%Y %H:%M" if us.notna().all() else "%d-%m-%Y %H:%M"
+    stamps = pd.to_datetime(raw_times, format=state["date_format"], errors="coerce")
+    historic, h_low, h_high = _to_mgdl(chunk[cols["value"]], LIBRE_SENTINELS, cols["mmol"])
+    if cols["scan"] is not None and state["include_scans"]:
+        scan, s_low, s_high = _to_mgdl(chunk[cols["scan"]], LIBRE_SENTINELS, cols["mmol"])
+        is_scan = kinds == 1
+        historic = np.where(is_scan, scan, historic)
+        h_low = np.where(is_scan, s_low, h_low)
+        h_high = np.where(is_scan, s_high, h_high)
+    return stamps, historic, h_low, h_high, _sensor_ids(chunk, cols, "libreview")
+
+
+def import_export(file, user_id=None, store=None, chunk_rows=CHUNK_ROWS, progress=None, include_scans=False, dedup=None,
+                  rollup_writer=None):
+    """
+    Import a Dexcom Clarity or LibreView CSV (path, text or binary file object).
+    Readings are appended to `store` (a ReadingStore) when one is given;
+    `dedup` (a DedupIndex) skips (sensor, timestamp) pairs seen before.
+    With `rollup_writer` (a firestore_writer.BatchedWriter) the readings the
+    store actually added are folded into the daily rollups.
+    `progress(fraction)` is called after every chunk.
+    Returns a summary dict with the format, counts and the parsed GlucoseSeries.
+    """
+    opened = isinstance(file, str)
+    if opened:
+        file = open(file, "rb")
+    if hasattr(file, "seek"):
+        file.seek(0, io.SEEK_END)
+        total_bytes = file.tell() or 1
+        file.seek(0)
+    else:
+        total_bytes = None
+    raw = file
+    wrapped = not isinstance(raw, io.TextIOBase)
+    text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="") if wrapped else raw
+    try:
+        return _import_text(text, raw, total_bytes, user_id, store, chunk_rows, progress, include_scans, dedup,
+                            rollup_writer)
+    finally:
+        if wrapped:
+            # Hand the caller's file back instead of closing it with the wrapper
+            text.detach()
+        if opened:
+            raw.close()
+
+
+def _import_text(text, raw, total_bytes, user_id, store, chunk_rows, progress, include_scans, dedup,
+                 rollup_writer=None):
+    first_line = text.readline()
+    second_line = text.readline()
+    fmt, header = detect_format(first_line, second_line)
+    if fmt == "dexcom":
+        # The second line we peeked at is already data
+        body = io.StringIO(second_line)
+        cols = {
+            "time": _find(header, "Timestamp ("),
+            "value": _find(header, "Glucose Value"),
+            "event": _find(header, "Event Type"),
+            "sensor": _find(header, "Transmitter ID"),
+        }
+    else:
+        if next(csv.reader([first_line]), []) == header:
+            body = io.StringIO(second_line)
+        else:
+            body = io.StringIO("")
+        cols = {
+            "time": _find(header, "Device Timestamp"),
+            "value": _find(header, "Historic Glucose"),
+            "scan": _find(header, "Scan Glucose"),
+            "type": _find(header, "Record Type"),
+            "sensor": _find(header, "Serial Number"),
+        }
+    cols["mmol"] = "mmol" in cols["value"].lower()
+    usecols = [c for k, c in cols.items() if k != "mmol" and c is not None]
+
+    state = {"include_scans": include_scans}
+    summary = {"format": fmt, "rows": 0, "readings": 0, "invalid": 0, "low": 0, "high": 0, "duplicates": 0, "imported": 0, "skipped": 0}
+    times_parts, value_parts, sensor_parts = [], [], []
+
+    for source in (body, text):
+        try:
+            reader = pd.read_csv(
+                source, header=None, names=header, usecols=usecols, dtype=str,
+                chunksize=chunk_rows, skip_blank_lines=True,
+            )
+            for chunk in reader:
+                if chunk.empty:
+                    continue
+                summary["rows"] += len(chunk)
+                if fmt == "dexcom":
+                    stamps, values, low, high, sensors = _parse_dexcom_chunk(chunk, cols)
+                else:
+                    stamps, values, low, high, sensors = _parse_libre_chunk(chunk, cols, state)
+                ok = stamps.notna().to_numpy() & ~np.isnan(values)
+                summary["invalid"] += int((~ok).sum())
+                summary["low"] += int(low[ok].sum())
+                summary["high"] += int(high[ok].sum())
+                times_parts.append(stamps[ok].to_numpy(dtype="datetime64[s]").astype(np.int64))
+                value_parts.append(values[ok])
+                sensor_parts.append(sensors[ok])
+                if progress is not None and total_bytes and source is text:
+                    progress(min(raw.tell() / total_bytes, 1.0))
+        except pd.errors.EmptyDataError:
+            pass
+
+    times = np.concatenate(times_parts) if times_parts else np.empty(0, dtype=np.int64)
+    values = np.concatenate(value_parts) if value_parts else np.empty(0)
+    sensors = np.concatenate(sensor_parts) if sensor_parts else np.empty(0, dtype=object)
+    summary["readings"] = len(times)
+    fresh = {}
+    if dedup is not None and user_id:
+        keep = np.ones(times.size, dtype=bool)
+        for sensor in pd.unique(sensors):
+            rows = np.flatnonzero(sensors == sensor)
+            new = dedup.new_mask(user_id, sensor, times[rows])
+            keep[rows[~new]] = False
+            fresh[sensor] = times[rows[new]]
+        summary["duplicates"] = int((~keep).sum())
+        times, values = times[keep], values[keep]
+    series = GlucoseSeries(times, values)
+    written = None
+    if store is not None and user_id:
+        written = store.append(user_id, series.times, series.values)
+        summary["imported"] = int(written.size)
+        # Another sensor's reading already holds that second in the store
+        summary["skipped"] = int(np.unique(series.times).size - written.size)
+        if rollup_writer is not None and written.size:
+            # First reading per timestamp, as the store keeps it
+            stamps, first = np.unique(series.times, return_index=True)
+            added = np.isin(stamps, written)
+            daily_rollup.record_readings(rollup_writer, user_id, stamps[added], series.values[first][added])
+    if fresh:
+        # Only mark readings as seen once the write they guard has landed
+        for sensor, stamps in fresh.items():
+            if written is not None:
+                stamps = stamps[np.isin(stamps, written)]
+            dedup.add(user_id, sensor, stamps)
+        dedup.save(user_id)
+    if progress is not None:
+        progress(1.0)
+    summary["series"] = series
+    return summary
@@ -0,0 +1,182 @@
+# ✅ Shared CGM text parser
+# -------------------------------------------------------
+# One parser for every page that accepts pasted glucose data:
+#   - comma-separated values ("110,115,120") on the WHOOP + CGM, Trend and
+#     Insulin Resistance pages
+#   - "HH:MM,glucose" pairs separated by spaces/newlines on Glucose & Chat
+# Clean input is converted in bulk (one C-level split plus one NumPy
+# conversion, or one regex scan for pairs). Only when something fails is
+# the text walked token by token to build the error report, so bad tokens
+# are reported instead of silently dropped.
+# Both paths accept the same number grammar: plain decimals such as "110",
+# "-5", "98.6", ".5". Exponents, "nan" and "inf" are reported as errors. The
+# bulk path only runs on text made of the characters that grammar uses, so
+# NumPy's more lenient float parsing never decides what is valid.
+
+import re
+
+import numpy as np
+
+# Readings outside this range are sensor errors or typos (mg/dL)
+MIN_GLUCOSE = 20
+MAX_GLUCOSE = 600
+
+_DECIMAL = r"[-+]?(?:\d+\.?\d*|\.\d+)"
+_NUMBER = re.compile(_DECIMAL)
+_PAIR = re.compile(rf"(\d{{1,2}}:\d{{2}}),({_DECIMAL})")
+# Text that can only hold decimals and separators (anything else needs the slow path)
+_PLAIN_VALUES = re.compile(r"[\d.+\-,;\s]*")
+_PLAIN_PAIRS = re.compile(r"[\d.+\-:,\s]*")
+
+
+class ParseResult:
+    """Parsed values (float64 array), optional time labels and a per-token error report"""
+
+    __slots__ = ("values", "times", "errors")
+
+    def __init__(self, values, times=None, errors=None):
+        self.values = values
+        self.times = times
+        self.errors = errors or []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def as_ints(self):
+        return np.rint(self.values).astype(np.int64).tolist()
+
+    def readings(self):
+        """[{"time", "glucose"}] dicts for the /analyze payload"""
+        return [{"time": t, "glucose": int(round(v))} for t, v in zip(self.times, self.values.tolist())]
+
+    def error_summary(self, limit=5):
+        """Short human-readable description of the first few problems"""
+        if not self.errors:
+            return ""
+        shown = ", ".join(f"#{e['position'] + 1} '{e['token']}' ({e['reason']})" for e in self.errors[:limit])
+        more = f" and {len(self.errors) - limit} more" if len(self.errors) > limit else ""
+        return f"{len(self.errors)} invalid entr{'y' if len(self.errors) == 1 else 'ies'}: {shown}{more}"
+
+
+def _range_errors(values, tokens_at):
+    """Flag physiologically impossible values; returns (keep mask, errors)"""
+    bad = (values < MIN_GLUCOSE) | (values > MAX_GLUCOSE)
+    errors = [
+        {"position": int(i), "token": tokens_at(int(i)), "reason": f"outside {MIN_GLUCOSE}-{MAX_GLUCOSE} mg/dL"}
+        for i in np.flatnonzero(bad)
+    ]
+    return ~bad, errors
+
+
+def parse_values(text):
+    """Parse comma/space/semicolon-separated glucose values"""
+    # str.replace/split run in C; a regex split is several times slower here
+    tokens = text.replace(",", " ").replace(";", " ").split() if text else []
+    if not tokens:
+        return ParseResult(np.empty(0, dtype=np.float64))
+    try:
+        if not _PLAIN_VALUES.fullmatch(text):
+            raise ValueError(text)
+        values = np.array(tokens, dtype=np.float64)
+        errors = []
+        # Decimals can't be NaN; an absurdly long one overflows to inf and fails the range check
+        valid = ~np.isnan(values)
+    except ValueError:
+        # Slow path only for dirty input: find which tokens failed
+        valid_list = [bool(_NUMBER.fullmatch(t)) for t in tokens]
+        valid = np.array(valid_list)
+        values = np.full(len(tokens), np.nan)
+        values[valid] = np.array([t for t, ok in zip(tokens, valid_list) if ok], dtype=np.float64)
+        errors = [{"position": i, "token": t, "reason": "not a number"} for i, (t, ok) in enumerate(zip(tokens, valid_list)) if not ok]
+
+    in_range, range_errors = _range_errors(np.where(valid, values, MIN_GLUCOSE), tokens.__getitem__)
+    keep = valid & in_range
+    errors = sorted(errors + range_errors, key=lambda e: e["position"])
+    return ParseResult(values[keep], errors=errors)
+
+
+def _clock_digits(times):
+    """(n, 5) uint8 array of zero-padded "HH:MM" bytes, or None if any label is malformed"""
+    joined = "".join(times)
+    if len(joined) != 5 * len(times):
+        # Some labels are H:MM; pad those (and reject anything longer)
+        joined = "".join(t.rjust(5, "0") for t in times)
+        if len(joined) != 5 * len(times):
+            return None
+    try:
+        raw = joined.encode("ascii")
+    except UnicodeEncodeError:
+        return None
+    digits = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 5)
+    numeric = digits[:, [0, 1, 3, 4]]
+    if np.any(digits[:, 2] != ord(":")) or np.any((numeric < 48) | (numeric > 57)):
+        return None
+    return digits
+
+
+def _fast_pairs(stripped):
+    """Bulk path for clean input; returns (times, values, clock digits) or None if anything looks off"""
+    if not _PLAIN_PAIRS.fullmatch(stripped):
+        return None
+    n_tokens = len(stripped.split())
+    parts = stripped.replace(",", " ").split()
+    if len(parts) != 2 * n_tokens or stripped.count(",") != n_tokens:
+        return None
+    times = parts[0::2]
+    digits = _clock_digits(times)
+    if digits is None:
+        return None
+    try:
+        values = np.array(parts[1::2], dtype=np.float64)
+    except ValueError:
+        return None
+    return times, values, digits
+
+
+def parse_time_values(text):
+    """Parse whitespace-separated "HH:MM,glucose" pairs"""
+    stripped = text.strip() if text else ""
+    if not stripped:
+        return ParseResult(np.empty(0, dtype=np.float64), times=[])
+
+    fast = _fast_pairs(stripped)
+    if fast is not None:
+        times, values, digits = fast
+        errors = []
+        positions = np.arange(len(times))
+    else:
+        tokens = stripped.split()
+        times, raw_values, errors, kept = [], [], [], []
+        for i, token in enumerate(tokens):
+            m = _PAIR.fullmatch(token)
+            if m is None:
+                errors.append({"position": i, "token": token, "reason": "expected HH:MM,glucose"})
+                continue
+            times.append(m.group(1))
+            raw_values.append(m.group(2))
+            kept.append(i)
+        values = np.array(raw_values, dtype=np.float64)
+        positions = np.array(kept, dtype=np.int64)
+        # The regex already guarantees H:MM / HH:MM digits
+        digits = _clock_digits(times) if times else np.zeros((0, 5), dtype=np.uint8)
+
+    clock = digits.astype(np.int64) - 48
+    hours_ok = (clock[:, 0] * 10 + clock[:, 1] < 24) & (clock[:, 3] * 10 + clock[:, 4] < 60)
+
+    def token_at(j):
+        return f"{times[j]},{values[j]:g}"
+
+    in_range, range_errors = _range_errors(values, token_at)
+    for e in range_errors:
+        e["position"] = int(positions[e["position"]])
+    errors += range_errors
+    errors += [
+        {"position": int(positions[j]), "token": token_at(j), "reason": "invalid clock time"}
+        for j in np.flatnonzero(~hours_ok)
+    ]
+    keep = in_range & hours_ok
+    errors.sort(key=lambda e: e["position"])
+    if not keep.all():
+        times = [t for t, k in zip(times, keep.tolist()) if k]
+    return ParseResult(values[keep], times=times, errors=errors)
@@ -0,0 +1,98 @@
+# ✅ Gap-aware resampling onto a fixed 5-minute grid
+# -------------------------------------------------------
+# Sensor readings arrive irregularly: warm-up gaps, dropouts and duplicated
+# backfill after phone reconnects. This aligns them to a fixed grid (duplicates
+# in the same slot are averaged), linearly fills short gaps, leaves long gaps
+# as NaN and reports wear time. Times are in minutes by default; pass step
+# and max_gap in seconds when working with epoch seconds.
+
+import numpy as np
+
+DEFAULT_STEP = 5
+DEFAULT_MAX_GAP = 20
+
+
+def resample_to_grid(times, values, step=DEFAULT_STEP, max_gap=DEFAULT_MAX_GAP, start=None, end=None):
+    """
+    Align one trace to a fixed grid.
+    Returns {"start", "step", "values", "observed", "wear_pct", "interpolated", "missing"}
+    where `values` holds one float per slot (NaN = missing) and `observed` marks
+    slots that had at least one real reading.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    keep = ~np.isnan(values)
+    times, values = times[keep], values[keep]
+
+    if start is None:
+        start = np.floor(times.min() / step) * step if times.size else 0.0
+    if end is None:
+        end = times.max() if times.size else start
+    # Same rounding as the slot assignment below, so the last reading always lands on the grid
+    n_slots = int(np.rint((end - start) / step)) + 1
+
+    slots = np.rint((times - start) / step).astype(np.int64)
+    inside = (slots >= 0) & (slots < n_slots)
+    slots, values = slots[inside], values[inside]
+
+    # Average duplicates that land in the same slot
+    counts = np.bincount(slots, minlength=n_slots)
+    sums = np.bincount(slots, weights=values, minlength=n_slots)
+    observed = counts > 0
+    grid = np.full(n_slots, np.nan)
+    grid[observed] = sums[observed] / counts[observed]
+
+    # Fill NaN runs bounded by readings no more than max_gap apart
+    filled = np.zeros(n_slots, dtype=bool)
+    if observed.sum() >= 2:
+        idx = np.arange(n_slots)
+        prev_obs = np.maximum.accumulate(np.where(observed, idx, -1))
+        next_obs = np.minimum.accumulate(np.where(observed, idx, n_slots)[::-1])[::-1]
+        bounded = ~observed & (prev_obs >= 0) & (next_obs < n_slots)
+        short = bounded & ((next_obs - prev_obs) * step <= max_gap)
+        if short.any():
+            obs_idx = np.flatnonzero(observed)
+            grid[short] = np.interp(idx[short], obs_idx, grid[obs_idx])
+            filled = short
+
+    n_observed = int(observed.sum())
+    return {
+        "start": float(start),
+        "step": step,
+        "values": grid,
+        "observed": observed,
+        "wear_pct": round(n_observed / n_slots * 100, 1) if n_slots else 0.0,
+        "interpolated": int(filled.sum()),
+        "missing": int(n_slots - n_observed - filled.sum()),
+    }
+
+
+def resample_many(traces, step=DEFAULT_STEP, max_gap=DEFAULT_MAX_GAP):
+    """
+    Resample many users onto one shared grid.
+    `traces` is {user_id: (times, values)}. Returns (user_ids, start, matrix,
+    wear_pct) where matrix is (users x slots) with NaN gaps, ready for
+    glycemic_metrics.compute_metrics_batch.
+    """
+    user_ids = list(traces)
+    firsts = [np.min(t) for t, _ in traces.values() if len(t)]
+    lasts = [np.max(t) for t, _ in traces.values() if len(t)]
+    if not firsts:
+        return user_ids, 0.0, np.full((len(user_ids), 0), np.nan), np.zeros(len(user_ids))
+    start = np.floor(min(firsts) / step) * step
+    end = max(lasts)
+
+    rows, wear = [], []
+    for user_id in user_ids:
+        times, values = traces[user_id]
+        result = resample_to_grid(times, values, step, max_gap, start=start, end=end)
+        rows.append(result["values"])
+        # Wear time is measured over the user's own span, not the shared grid
+        if len(times):
+            first = int(np.rint((np.min(times) - start) / step))
+            last = int(np.rint((np.max(times) - start) / step))
+            own = result["observed"][first:last + 1]
+            wear.append(round(own.mean() * 100, 1) if own.size else 0.0)
+        else:
+            wear.append(0.0)
+    return user_ids, float(start), np.vstack(rows), np.array(wear)
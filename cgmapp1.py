@@ -6,12 +6,26 @@ import json
 import os
 import openai
 import pandas as pd
+import numpy as np
 import plotly.express as px
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from io import StringIO
 import plotly.graph_objects as go
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, quote
 import secrets as py_secrets
+from glycemic_metrics import compute_metrics_batch, metrics_row
+from agp_engine import AGPStore, compute_agp, profile_to_rows
+from reading_store import ReadingStore
+from dedup_index import DedupIndex
+from cgm_import import import_export
+from cgm_parser import parse_time_values, parse_values
+from whoop_client import WhoopAPIError, fetch_summary_sync, validate_token_sync
+from whoop_sync import latest_summary, sync_user_sync
+from whoop_backfill import BackfillJob, run_backfill_sync
+from whoop_tokens import WhoopTokenManager, sign_state, verify_state
+from repository import STORAGE_BACKEND, open_repository
+from firestore_writer import BatchedWriter, log_glucose_day, log_whoop
+from daily_rollup import read_days
 # Set up OpenAI API key from secrets
 try:
     openai.api_key = st.secrets["OPENAI_API_KEY"]
@@ -25,6 +39,7 @@ except KeyError:
 WHOOP_API_BASE = "https://api.prod.whoop.com/developer"
 WHOOP_AUTH_URL = "https://api.prod.whoop.com/oauth/oauth2/auth"
 WHOOP_TOKEN_URL = "https://api.prod.whoop.com/oauth/oauth2/token"
+WHOOP_REDIRECT_URI = "http://localhost:8501/callback"
 
 # Load WHOOP OAuth credentials if available
 try:
@@ -52,72 +67,134 @@ st.sidebar.subheader("WHOOP Connection")
 
 # Function to test WHOOP token
 def test_whoop_token(token):
-    """Test if a WHOOP token is valid"""
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(f"{WHOOP_API_BASE}/v1/user/profile/basic", headers=headers)
-    return response.status_code == 200
+    """Test if a WHOOP token is valid (raises when WHOOP can't say: rate limit, outage, timeout)"""
+    return validate_token_sync(token)
+
+# One Firestore client per process (None when this deployment has no Firestore)
+@st.cache_resource
+def get_firestore_db():
+    if STORAGE_BACKEND != "firestore" or not os.path.exists("firebase_key.json"):
+        return None
+    try:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+    except ImportError:
+        return None
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate("firebase_key.json"))
+    return firestore.client()
+
+# Storage for users, tokens and synced WHOOP records (None when the Firestore backend has no client here)
+@st.cache_resource
+def get_repository():
+    return open_repository(db=get_firestore_db())
+
+# Queued writes for the Firestore logs and daily rollups
+@st.cache_resource
+def get_rollup_writer():
+    db = get_firestore_db()
+    return BatchedWriter(db) if db is not None else None
+
+# Cached, self-refreshing WHOOP tokens for OAuth-connected users (None without OAuth or storage)
+@st.cache_resource
+def get_token_manager():
+    repo = get_repository()
+    if not has_oauth_creds or repo is None:
+        return None
+    return WhoopTokenManager(repo, WHOOP_CLIENT_ID, WHOOP_CLIENT_SECRET, token_url=WHOOP_TOKEN_URL)
+
+def whoop_connected():
+    return "whoop_access_token" in st.session_state or "whoop_oauth_user" in st.session_state
+
+def current_whoop_token():
+    """The session's WHOOP access token: entered directly, or from the token manager after OAuth"""
+    oauth_user = st.session_state.get("whoop_oauth_user")
+    manager = get_token_manager()
+    if oauth_user and manager is not None:
+        return manager.get_access_token_sync(oauth_user)
+    return st.session_state.get("whoop_access_token")
+
+# One reading store and de-duplication index per process, shared by every session
+@st.cache_resource
+def get_reading_store():
+    return ReadingStore()
+
+@st.cache_resource
+def get_dedup_index():
+    return DedupIndex()
+
+# Binned AGP rows per user and period, shared by every session in this process
+@st.cache_resource
+def get_agp_store():
+    return AGPStore()
+
+# Typical values, only used for metrics WHOOP hasn't scored yet (and always flagged on the page)
+TYPICAL_WHOOP_VALUES = {"strain": 12, "recovery": 65, "sleep": 7.5}
 
 # Function to fetch WHOOP data
-def get_whoop_data(token):
-    """Fetch WHOOP data using the API"""
-    headers = {"Authorization": f"Bearer {token}"}
-    whoop_data = {"strain": 12, "recovery": 65, "sleep": 7.5}  # defaults
-    
-    # Calculate date range (last 7 days)
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=7)
-    
+def get_whoop_data():
+    """
+    Fetch WHOOP data. With a local store and a user ID, only new or changed
+    records are synced and the summary is read locally; otherwise cycles,
+    recovery and sleep are requested concurrently.
+    Returns (values, notes, live), or (None, error, False) when a metric
+    couldn't be loaded. Typical values only stand in for metrics WHOOP
+    hasn't scored yet; `live` is False when showing previously synced data.
+    """
+    repo = get_repository()
+    user_id = st.session_state.get("user_id")
+    notes = []
+    live = True
     try:
-        # Fetch cycles (includes strain)
-        cycles_url = f"{WHOOP_API_BASE}/v1/cycle"
-        params = {
-            "start": start_date.isoformat() + "Z",
-            "end": end_date.isoformat() + "Z",
-            "limit": 10
-        }
-        
-        response = requests.get(cycles_url, headers=headers, params=params)
-        if response.status_code == 200:
-            cycles = response.json().get("records", [])
-            if cycles:
-                # Get the most recent scored cycle
-                for cycle in cycles:
-                    if cycle.get("score_state") == "SCORED" and cycle.get("score"):
-                        whoop_data["strain"] = round(cycle["score"]["strain"], 1)
-                        break
-        
-        # Fetch recovery
-        recovery_url = f"{WHOOP_API_BASE}/v1/recovery"
-        response = requests.get(recovery_url, headers=headers, params=params)
-        if response.status_code == 200:
-            recoveries = response.json().get("records", [])
-            if recoveries:
-                for recovery in recoveries:
-                    if recovery.get("score_state") == "SCORED" and recovery.get("score"):
-                        whoop_data["recovery"] = round(recovery["score"]["recovery_score"])
-                        break
-        
-        # Fetch sleep
-        sleep_url = f"{WHOOP_API_BASE}/v1/activity/sleep"
-        response = requests.get(sleep_url, headers=headers, params=params)
-        if response.status_code == 200:
-            sleeps = response.json().get("records", [])
-            if sleeps:
-                for sleep in sleeps:
-                    if sleep.get("score_state") == "SCORED" and sleep.get("score"):
-                        # Convert milliseconds to hours
-                        total_sleep_ms = sleep["score"]["stage_summary"]["total_in_bed_time_milli"]
-                        total_sleep_ms -= sleep["score"]["stage_summary"]["total_awake_time_milli"]
-                        whoop_data["sleep"] = round(total_sleep_ms / 1000 / 60 / 60, 1)
-                        break
-                        
+        token = current_whoop_token()
+        if repo is not None and user_id:
+            sync_user_sync(repo, token, user_id)
+            summary = latest_summary(repo, user_id)
+        else:
+            summary = fetch_summary_sync(token)
     except Exception as e:
-        st.warning(f"Error fetching WHOOP data: {str(e)}")
-    
-    return whoop_data
+        if repo is None or not user_id:
+            return None, f"Could not reach WHOOP: {e}", False
+        # Rate limited or down: the last synced records are still real data
+        summary = latest_summary(repo, user_id)
+        missing = [k for k in ("strain", "recovery", "sleep") if getattr(summary, k) is None]
+        if missing:
+            # Without WHOOP we can't tell "not scored yet" from "not synced yet"
+            return None, f"Could not reach WHOOP and no synced {', '.join(missing)} to show: {e}", False
+        notes.append(f"WHOOP is unavailable ({e}); showing your last synced data.")
+        live = False
+    if summary.failed:
+        errors = "; ".join(f"{k}: {v}" for k, v in summary.errors.items())
+        return None, f"Could not load WHOOP {', '.join(summary.failed)}: {errors}", False
+    writer = get_rollup_writer()
+    if live and writer is not None and user_id:
+        # Keyed by date, so reruns overwrite today's log and rollup fields (typical values are never logged)
+        log_whoop(writer, user_id, date.today(), summary.strain, summary.recovery, summary.sleep)
+    missing = [k for k in ("strain", "recovery", "sleep") if getattr(summary, k) is None]
+    if missing:
+        notes.append(f"No scored WHOOP {', '.join(missing)} in the last 7 days; using typical values for those.")
+    return summary.to_dict(TYPICAL_WHOOP_VALUES), notes, live
+
+# OAuth callback: exchange the code once, then keep only the user ID in the session
+if "code" in st.query_params and "state" in st.query_params:
+    manager = get_token_manager()
+    try:
+        if manager is None:
+            raise RuntimeError("OAuth needs WHOOP credentials and a storage backend")
+        # The redirect starts a new session; only a state this app signed may name the user
+        oauth_user = verify_state(WHOOP_CLIENT_SECRET, st.query_params["state"])
+        if oauth_user is None:
+            raise RuntimeError("the sign-in link is invalid or expired, please connect again")
+        manager.exchange_code_sync(oauth_user, st.query_params["code"], WHOOP_REDIRECT_URI)
+        st.session_state["whoop_oauth_user"] = oauth_user
+        st.session_state.user_id = oauth_user
+        st.sidebar.success("✅ WHOOP connected via OAuth!")
+    except Exception as e:
+        st.sidebar.error(f"❌ WHOOP OAuth failed: {e}")
+    st.query_params.clear()
 
 # WHOOP Connection Options
-if "whoop_access_token" not in st.session_state:
+if not whoop_connected():
     connection_method = st.sidebar.radio(
         "Connection Method:",
         ["Use Demo Data", "Direct Token Entry", "OAuth (Local Only)"]
@@ -139,11 +216,22 @@ if "whoop_access_token" not in st.session_state:
         
         if st.sidebar.button("Connect with Token"):
             if token_input:
-                if test_whoop_token(token_input):
+                try:
+                    valid = test_whoop_token(token_input)
+                except WhoopAPIError as e:
+                    valid = None
+                    if e.status_code == 429:
+                        st.sidebar.error("⏳ WHOOP rate limit reached; try again in a minute.")
+                    else:
+                        st.sidebar.error(f"⚠️ WHOOP is having problems ({e.status_code}); try again shortly.")
+                except Exception as e:
+                    valid = None
+                    st.sidebar.error(f"⚠️ Could not reach WHOOP: {e or type(e).__name__}")
+                if valid:
                     st.session_state["whoop_access_token"] = token_input
                     st.sidebar.success("✅ Token validated!")
                     st.rerun()
-                else:
+                elif valid is False:
                     st.sidebar.error("❌ Invalid token")
             else:
                 st.sidebar.error("Please enter a token")
@@ -158,13 +246,18 @@ if "whoop_access_token" not in st.session_state:
         3. Connect via OAuth on localhost
         """)
         
-        if has_oauth_creds:
+        oauth_user = st.session_state.get("user_id")
+        if has_oauth_creds and get_token_manager() is None:
+            st.sidebar.info("OAuth tokens need a storage backend (set STORAGE_BACKEND=sqlite to run without Firestore).")
+        elif has_oauth_creds and not oauth_user:
+            st.sidebar.info("Enter your user ID on the Glucose & Chat page first; your WHOOP tokens are saved under it.")
+        elif has_oauth_creds:
             oauth_url = (
                 f"{WHOOP_AUTH_URL}?client_id={WHOOP_CLIENT_ID}"
-                f"&redirect_uri=http://localhost:8501/callback"
+                f"&redirect_uri={WHOOP_REDIRECT_URI}"
                 f"&response_type=code"
                 f"&scope=read:recovery read:cycles read:sleep read:workout read:profile read:body_measurement"
-                f"&state=whoop_oauth_state"
+                f"&state={quote(sign_state(WHOOP_CLIENT_SECRET, oauth_user), safe='')}"
             )
             st.sidebar.markdown(f"[Connect via OAuth (Local Only)]({oauth_url})")
             
@@ -174,9 +267,25 @@ else:
         st.sidebar.success("✅ Using Demo Data")
     else:
         st.sidebar.success("✅ WHOOP Connected")
+        history_repo = get_repository()
+        history_user = st.session_state.get("user_id")
+        if history_repo is not None and history_user and st.sidebar.button("Import WHOOP history"):
+            bar = st.sidebar.progress(0.0, text="Importing WHOOP history...")
+
+            def show_progress(p):
+                bar.progress(p["done"] / max(p["total"], 1), text=f"Importing WHOOP history... {p['records']} records")
+
+            try:
+                result = run_backfill_sync(history_repo, current_whoop_token(), BackfillJob(history_user), show_progress)
+                st.sidebar.success(f"✅ Imported {result['records']} WHOOP records ({result['skipped']} windows already done)")
+            except Exception as e:
+                st.sidebar.error(f"WHOOP history import stopped, press again to resume: {e}")
     
     if st.sidebar.button("Disconnect"):
-        for key in ["whoop_access_token", "use_demo_data"]:
+        manager = get_token_manager()
+        if manager is not None and "whoop_oauth_user" in st.session_state:
+            manager.invalidate(st.session_state["whoop_oauth_user"])
+        for key in ["whoop_access_token", "whoop_oauth_user", "use_demo_data"]:
             if key in st.session_state:
                 del st.session_state[key]
         st.rerun()
@@ -203,10 +312,16 @@ if page == "WHOOP + CGM Adjustments":
             "strain": 12, "recovery": 65, "sleep": 7.5
         })
         st.info("📊 Using demo WHOOP data (customize in sidebar)")
-    elif "whoop_access_token" in st.session_state:
+    elif whoop_connected():
         with st.spinner("Fetching WHOOP data..."):
-            whoop_data = get_whoop_data(st.session_state["whoop_access_token"])
-        st.success("📊 Using live WHOOP data")
+            whoop_data, whoop_notes, whoop_live = get_whoop_data()
+        if whoop_data is None:
+            st.error(f"❌ {whoop_notes} Try again shortly, or switch to demo data in the sidebar.")
+            st.stop()
+        for note in whoop_notes:
+            st.warning(note)
+        if whoop_live:
+            st.success("📊 Using live WHOOP data")
     else:
         whoop_data = {"strain": 12, "recovery": 65, "sleep": 7.5}
         st.warning("📊 Using default values - connect WHOOP in sidebar")
@@ -223,7 +338,10 @@ if page == "WHOOP + CGM Adjustments":
     # CGM input
     st.subheader("CGM Data")
     cgm_data = st.text_area("Enter CGM values (comma-separated)", "110,115,120,108,95")
-    cgm_values = [int(x.strip()) for x in cgm_data.split(",") if x.strip().isdigit()]
+    cgm_parsed = parse_values(cgm_data)
+    if not cgm_parsed.ok:
+        st.warning(f"⚠️ Skipped {cgm_parsed.error_summary()}")
+    cgm_values = cgm_parsed.as_ints()
     
     # Base macros
     base_cals = st.session_state.get("calories", 2200)
@@ -458,12 +576,24 @@ elif page == "Glucose & Chat":
 
     if submitted:
         try:
-            lines = glucose_data.strip().split(" ")
-            readings = [{"time": t.strip(), "glucose": int(v.strip())} for t, v in (line.split(",") for line in lines)]
+            parsed = parse_time_values(glucose_data)
+            if not parsed.ok:
+                st.warning(f"⚠️ Skipped {parsed.error_summary()}")
+            readings = parsed.readings()
+            # Saved USDA meals carry a timestamp, so spikes can be traced back to them.
+            # The pasted trace has clock times only, so send the last 24 hours of meals;
+            # the engine places each on the trace's timeline and ignores any outside it
+            cutoff = datetime.now() - timedelta(days=1)
+            meals = []
+            for m in st.session_state.get("saved_meals", []):
+                stamp = datetime.fromisoformat(m["timestamp"]) if m.get("timestamp") else None
+                if stamp is not None and stamp >= cutoff:
+                    meals.append({"time": stamp.strftime("%H:%M"), "description": m["description"]})
             payload = {
                 "glucose_readings": readings,
                 "bodyweight_kg": bodyweight,
-                "goal": goal
+                "goal": goal,
+                "meals": meals
             }
             response = requests.post("http://localhost:8000/analyze", json=payload)
             if response.status_code == 200:
@@ -496,6 +626,8 @@ elif page == "Glucose & Chat":
                 if spikes:
                     s = spikes[-1]
                     reply = f"You had a glucose spike from {s['from']} to {s['to']} with a +{s['delta']} mg/dL increase."
+                    if s.get("meal"):
+                        reply += f" It most likely followed your {s['meal']}."
                 else:
                     reply = "No spikes were recorded today."
             elif "low" in user_input.lower():
@@ -537,12 +669,13 @@ elif page == "Insulin Resistance":
 
     monitor_days = st.slider("Select monitoring period (days)", min_value=3, max_value=14, value=7)
 
-    try:
-        fasting_values = [int(x.strip()) for x in fasting_data.split(",") if x.strip().isdigit()][:monitor_days]
-        postmeal_values = [int(x.strip()) for x in postmeal_data.split(",") if x.strip().isdigit()][:monitor_days]
-    except:
-        fasting_values = []
-        postmeal_values = []
+    fasting_parsed = parse_values(fasting_data)
+    postmeal_parsed = parse_values(postmeal_data)
+    for label, parsed in (("fasting", fasting_parsed), ("post-meal", postmeal_parsed)):
+        if not parsed.ok:
+            st.warning(f"⚠️ Skipped {label}: {parsed.error_summary()}")
+    fasting_values = fasting_parsed.as_ints()[:monitor_days]
+    postmeal_values = postmeal_parsed.as_ints()[:monitor_days]
 
     if fasting_values and postmeal_values and len(fasting_values) == len(postmeal_values):
         dates = [f"Day {i+1}" for i in range(len(fasting_values))]
@@ -566,6 +699,22 @@ elif page == "Insulin Resistance":
             st.warning("🟡 Early insulin resistance risk. Monitor your diet.")
         else:
             st.success("🟢 Glucose levels are within normal range.")
+
+        # Daily values: one row per series, one sample per day
+        st.subheader("📐 Glycemic Variability")
+        gv_batch = compute_metrics_batch([fasting_values, postmeal_values], sample_minutes=1440)
+        gv_rows = [metrics_row(gv_batch, i) for i in range(2)]
+        df_gv = pd.DataFrame(gv_rows, index=["Fasting", "Post-Meal"])
+        st.dataframe(df_gv[["mean", "sd", "cv", "gmi", "j_index", "modd", "mage", "lbgi", "hbgi", "tir_70_180", "tar_180"]])
+
+        log_user = st.session_state.get("user_id")
+        writer = get_rollup_writer()
+        if writer is not None and log_user and st.button(f"💾 Save as the last {len(fasting_values)} days"):
+            # Day 1 is the oldest; the last value is today
+            first = date.today() - timedelta(days=len(fasting_values) - 1)
+            for i, (fasting, postmeal) in enumerate(zip(fasting_values, postmeal_values)):
+                log_glucose_day(writer, log_user, first + timedelta(days=i), fasting, postmeal)
+            st.success(f"✅ Saved {len(fasting_values)} days to {log_user}'s daily log")
     else:
         st.info("Please enter equal-length data sets.")
 
@@ -573,14 +722,111 @@ elif page == "Insulin Resistance":
 elif page == "Glucose Trend Charts":
     st.title("📈 Glucose Trend Visualization")
 
-    cgm_data = st.text_area("Enter CGM values (comma-separated)", "110,115,120,108,95")
-    cgm_values = [int(x.strip()) for x in cgm_data.split(",") if x.strip().isdigit()]
-    if cgm_values:
+    store = get_reading_store()
+    trend_user = st.session_state.get("user_id")
+
+    with st.expander("📥 Import Dexcom Clarity / LibreView export"):
+        import_user = st.text_input("User ID", trend_user or "")
+        export_file = st.file_uploader("CSV export", type=["csv"])
+        if export_file and import_user and st.button("Import readings"):
+            bar = st.progress(0.0, text="Parsing export...")
+            try:
+                summary = import_export(
+                    export_file, import_user, store,
+                    progress=lambda f: bar.progress(f, text=f"Parsing export... {f:.0%}"),
+                    dedup=get_dedup_index(),
+                    rollup_writer=get_rollup_writer(),
+                )
+                st.session_state.user_id = import_user
+                trend_user = import_user
+                if summary["imported"]:
+                    # New readings change every stored period's profile
+                    get_agp_store().invalidate(import_user)
+                st.success(
+                    f"✅ {summary['format']} export: {summary['imported']} new readings stored "
+                    f"({summary['readings']} parsed, {summary['duplicates']} already imported, {summary['low']} Low / {summary['high']} High, {summary['invalid']} skipped)"
+                )
+                if summary["skipped"]:
+                    st.warning(f"⚠️ {summary['skipped']} readings fall on times that already hold another sensor's reading and were not stored.")
+            except ValueError as e:
+                st.error(f"Import failed: {e}")
+
+    stored_count = store.count(trend_user) if trend_user else 0
+
+    source = "Paste values"
+    if stored_count:
+        source = st.radio("Data source", ["Stored history", "Paste values"], horizontal=True)
+
+    if source == "Stored history":
+        history_days = st.slider("History (days)", min_value=1, max_value=90, value=14)
+        # Zero-copy slice of the user's memory-mapped reading file
+        history = store.read_days(trend_user, history_days)
+        cgm_minutes = history.minutes
+        cgm_values = history.values
+        agp_period = None
+        if len(history):
+            # Keyed to the second, so readings imported by another worker start a new period
+            last = store.last_timestamp(trend_user)
+            bounds = np.array([last + 1 - history_days * 86400, last], dtype="datetime64[s]")
+            agp_period = AGPStore.period_key(*bounds.astype(str))
+    else:
+        cgm_data = st.text_area("Enter CGM values (comma-separated)", "110,115,120,108,95")
+        cgm_parsed = parse_values(cgm_data)
+        if not cgm_parsed.ok:
+            st.warning(f"⚠️ Skipped {cgm_parsed.error_summary()}")
+        cgm_values = cgm_parsed.as_ints()
+        cgm_minutes = [i * 5 for i in range(len(cgm_values))]
+        agp_period = None
+    chart_type = st.radio(
+        "Chart", ["Ambulatory Glucose Profile (5-minute readings)", "Raw readings", "Daily summary"], horizontal=True
+    )
+
+    # Pasted values are binned once per input; reruns reuse the ~288 precomputed rows
+    @st.cache_data(show_spinner=False)
+    def agp_rows(minutes, values):
+        return profile_to_rows(compute_agp(minutes, values))
+
+    if chart_type == "Daily summary":
+        db = get_firestore_db()
+        if db is None or not trend_user:
+            st.info("Daily summaries need a user ID and the Firestore backend.")
+        else:
+            # One rollup document per month instead of every reading and log
+            summary_days = history_days if source == "Stored history" else 30
+            df_days = pd.DataFrame(read_days(db, trend_user, summary_days))
+            if df_days.empty:
+                st.info("No daily summaries yet. Import a CGM export, save fasting/post-meal values or sync WHOOP.")
+            else:
+                glucose_cols = [c for c in ("mean", "fasting", "postmeal") if df_days[c].notna().any()]
+                if glucose_cols:
+                    df_plot = df_days[["date"] + glucose_cols].astype({c: float for c in glucose_cols})
+                    fig = px.line(df_plot, x="date", y=glucose_cols, markers=True, title=f"Daily glucose, last {summary_days} days")
+                    fig.update_layout(xaxis_title="Date", yaxis_title="Glucose (mg/dL)")
+                    st.plotly_chart(fig)
+                st.dataframe(df_days.set_index("date")[["mean", "tir", "readings", "lows", "highs", "strain", "recovery", "sleep_hours"]])
+    elif len(cgm_values) and chart_type.startswith("Ambulatory"):
+        if agp_period is not None:
+            # Stored history: rows are kept per user and period (dropped again on import)
+            rows = get_agp_store().get_or_compute(trend_user, agp_period, history.minutes, history.values)
+        else:
+            rows = agp_rows(tuple(int(m) for m in cgm_minutes), tuple(cgm_values))
+        df_agp = pd.DataFrame(rows).dropna()
+        df_agp["Time"] = pd.to_datetime(df_agp["minute_of_day"], unit="m").dt.strftime("%H:%M")
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=df_agp["Time"], y=df_agp["p95"], line=dict(width=0), showlegend=False))
+        fig.add_trace(go.Scatter(x=df_agp["Time"], y=df_agp["p5"], fill="tonexty", line=dict(width=0), name="5–95%", fillcolor="rgba(99,110,250,0.15)"))
+        fig.add_trace(go.Scatter(x=df_agp["Time"], y=df_agp["p75"], line=dict(width=0), showlegend=False))
+        fig.add_trace(go.Scatter(x=df_agp["Time"], y=df_agp["p25"], fill="tonexty", line=dict(width=0), name="25–75%", fillcolor="rgba(99,110,250,0.35)"))
+        fig.add_trace(go.Scatter(x=df_agp["Time"], y=df_agp["p50"], line=dict(color="rgb(99,110,250)"), name="Median"))
+        fig.add_hrect(y0=70, y1=180, fillcolor="green", opacity=0.07, line_width=0)
+        fig.update_layout(title="Ambulatory Glucose Profile", xaxis_title="Time of day", yaxis_title="Glucose (mg/dL)")
+        st.plotly_chart(fig)
+    elif len(cgm_values):
         df = pd.DataFrame({
-            "Day": [f"Day {i+1}" for i in range(len(cgm_values))],
+            "Reading": [i + 1 for i in range(len(cgm_values))],
             "Glucose": cgm_values
         })
-        fig = px.line(df, x="Day", y="Glucose", markers=True, title="Glucose Readings Over Time")
+        fig = px.line(df, x="Reading", y="Glucose", markers=True, title="Glucose Readings Over Time")
         st.plotly_chart(fig)
 
 
@@ -640,7 +886,8 @@ if page == "USDA Food Search":
                         "calories": macros['Energy'],
                         "protein": macros['Protein'],
                         "carbs": macros['Carbohydrate, by difference'],
-                        "fat": macros['Total lipid (fat)']
+                        "fat": macros['Total lipid (fat)'],
+                        "timestamp": datetime.now().isoformat()
                     }
                     if "saved_meals" not in st.session_state:
                         st.session_state.saved_meals = []
@@ -0,0 +1,139 @@
+# ✅ Pre-aggregated daily rollups for trend pages
+# -------------------------------------------------------
+# One document per user per month, users/{id}/rollups/{YYYY-MM}, holding a
+# "days" map keyed by day of month ("01".."31"). Every write updates it
+# incrementally:
+#   - each batch of CGM readings stores its per-day sums and counts as a
+#     part under days.{DD}.parts.{id}, where the id is a hash of the
+#     readings. Rewriting a part is harmless, so a batch commit retried after
+#     an ambiguous error (DeadlineExceeded, ServiceUnavailable) can't double
+#     count, and concurrent writers never read-modify-write. Reads add the
+#     parts up.
+#   - fasting / post-meal logs and WHOOP strain / recovery / sleep are
+#     per-day values and are simply overwritten
+# A trend page then reads one document per month instead of streaming
+# every log or reading. Parts are per import, not per reading: feed
+# record_readings the readings a store write actually added (cgm_import
+# does), not a live stream.
+
+import hashlib
+
+import numpy as np
+
+import glucose_engine
+
+COLLECTION = "rollups"
+
+# Per-day fields summed over a day's parts; everything else is last-write-wins
+COUNTERS = ("glucose_sum", "glucose_n", "in_range_n", "low_n", "high_n")
+
+
+def month_key(date):
+    """"YYYY-MM" for a date / "YYYY-MM-DD" string"""
+    return str(date)[:7]
+
+
+def _day_update(date, fields):
+    return month_key(date), {"days": {str(date)[8:10]: fields}}
+
+
+def _part_id(times, values):
+    """Stable id for one day's readings in a batch, so rewriting it is idempotent"""
+    h = hashlib.blake2b(digest_size=8)
+    h.update(np.ascontiguousarray(times, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+# ✅ Incremental updates (queued on a BatchedWriter)
+def record_readings(writer, user_id, times, values):
+    """Fold CGM readings (epoch seconds, mg/dL) into their days' counters as one part per day"""
+    times = np.asarray(times, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    if times.size == 0:
+        return 0
+    order = np.argsort(times, kind="stable")
+    times, values = times[order], values[order]
+    days, first, inverse = np.unique(times // 86400, return_index=True, return_inverse=True)
+    bounds = np.append(first, times.size)
+    in_range = (values >= glucose_engine.LOW_THRESHOLD) & (values <= glucose_engine.HIGH_THRESHOLD)
+    sums = {
+        "glucose_sum": np.bincount(inverse, weights=values),
+        "glucose_n": np.bincount(inverse),
+        "in_range_n": np.bincount(inverse, weights=in_range),
+        "low_n": np.bincount(inverse, weights=values < glucose_engine.LOW_THRESHOLD),
+        "high_n": np.bincount(inverse, weights=values > glucose_engine.HIGH_THRESHOLD),
+    }
+    dates = np.datetime_as_string(days.astype("datetime64[D]"))
+    months = {}
+    for i, date in enumerate(dates.tolist()):
+        part = {name: float(sums[name][i]) if name == "glucose_sum" else int(sums[name][i]) for name in COUNTERS}
+        lo, hi = bounds[i], bounds[i + 1]
+        month, update = _day_update(date, {"parts": {_part_id(times[lo:hi], values[lo:hi]): part}})
+        months.setdefault(month, {"days": {}})["days"].update(update["days"])
+    # One merged write per touched month
+    for month, update in months.items():
+        writer.set(user_id, COLLECTION, month, update, merge=True)
+    return len(dates)
+
+
+def record_glucose_log(writer, user_id, date, fasting=None, postmeal=None):
+    fields = {k: v for k, v in (("fasting", fasting), ("postmeal", postmeal)) if v is not None}
+    month, update = _day_update(date, fields)
+    writer.set(user_id, COLLECTION, month, update, merge=True)
+
+
+def record_whoop(writer, user_id, date, strain=None, recovery=None, sleep_hours=None):
+    fields = {
+        k: v for k, v in (("strain", strain), ("recovery", recovery), ("sleep_hours", sleep_hours))
+        if v is not None
+    }
+    month, update = _day_update(date, fields)
+    writer.set(user_id, COLLECTION, month, update, merge=True)
+
+
+# ✅ Reads
+def day_rows(month, days):
+    """Flatten a month's "days" map into sorted rows with derived mean and TIR"""
+    rows = []
+    for day in sorted(days):
+        d = dict(days[day])
+        for part in (d.get("parts") or {}).values():
+            for name in COUNTERS:
+                d[name] = d.get(name, 0) + part.get(name, 0)
+        n = d.get("glucose_n", 0)
+        rows.append({
+            "date": f"{month}-{day}",
+            "mean": round(d["glucose_sum"] / n, 1) if n else None,
+            "tir": round(100 * d.get("in_range_n", 0) / n, 1) if n else None,
+            "readings": n,
+            "lows": d.get("low_n", 0),
+            "highs": d.get("high_n", 0),
+            "fasting": d.get("fasting"),
+            "postmeal": d.get("postmeal"),
+            "strain": d.get("strain"),
+            "recovery": d.get("recovery"),
+            "sleep_hours": d.get("sleep_hours"),
+        })
+    return rows
+
+
+def read_range(db, user_id, start_date, end_date):
+    """Day rows for start_date..end_date inclusive ("YYYY-MM-DD"), one document read per month"""
+    months = np.arange(
+        np.datetime64(month_key(start_date), "M"), np.datetime64(month_key(end_date), "M") + 1
+    ).astype(str).tolist()
+    base = db.collection("users").document(user_id).collection(COLLECTION)
+    rows = []
+    # get_all fetches every month bucket in a single round trip
+    for doc in db.get_all([base.document(m) for m in months]):
+        if doc.exists:
+            rows += day_rows(doc.id, (doc.to_dict() or {}).get("days", {}))
+    rows.sort(key=lambda r: r["date"])
+    return [r for r in rows if str(start_date) <= r["date"] <= str(end_date)]
+
+
+def read_days(db, user_id, days, today=None):
+    """The last `days` days of rollups ending today"""
+    end = np.datetime64(today, "D") if today is not None else np.datetime64("today", "D")
+    return read_range(db, user_id, str(end - (days - 1)), str(end))
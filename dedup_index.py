@@ -0,0 +1,104 @@
+# ✅ Reading de-duplication index
+# -------------------------------------------------------
+# Users re-import overlapping date ranges from their sensor apps. The index
+# remembers every (sensor id, timestamp) already ingested for a user as one
+# sorted int64 array per sensor, so checking a new batch is a single
+# searchsorted and repeated imports cost lookups instead of duplicate writes.
+# Each user's index is persisted as one .npz file next to the reading store;
+# saves merge with the file on disk under a lock, so writers never drop keys.
+
+import fcntl
+import os
+import threading
+from urllib.parse import quote
+
+import numpy as np
+
+INDEX_DIR = os.getenv("DEDUP_INDEX_DIR", os.path.join("reading_store", "dedup"))
+
+
+class DedupIndex:
+    """Per-user set of (sensor id, epoch-second timestamp) keys backed by sorted arrays"""
+
+    def __init__(self, root=INDEX_DIR):
+        self.root = root
+        if root:
+            os.makedirs(root, exist_ok=True)
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def _path(self, user_id):
+        return os.path.join(self.root, quote(user_id, safe="") + ".npz")
+
+    def _sensors(self, user_id):
+        """{sensor_id: sorted int64 array}, loaded from disk on first use (call with lock held)"""
+        sensors = self._users.get(user_id)
+        if sensors is None:
+            sensors = {}
+            if self.root and os.path.exists(self._path(user_id)):
+                with np.load(self._path(user_id)) as data:
+                    sensors = {name: data[name] for name in data.files}
+            self._users[user_id] = sensors
+        return sensors
+
+    def seen_mask(self, user_id, sensor_id, timestamps):
+        """Boolean mask: True where (sensor, timestamp) was already ingested"""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        with self._lock:
+            known = self._sensors(user_id).get(sensor_id)
+        if known is None or known.size == 0 or timestamps.size == 0:
+            return np.zeros(timestamps.size, dtype=bool)
+        pos = np.searchsorted(known, timestamps)
+        pos = np.minimum(pos, known.size - 1)
+        return known[pos] == timestamps
+
+    def new_mask(self, user_id, sensor_id, timestamps):
+        """
+        True for readings that are neither already indexed nor repeated earlier
+        in the same batch (first occurrence wins).
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        first = np.zeros(timestamps.size, dtype=bool)
+        _, first_idx = np.unique(timestamps, return_index=True)
+        first[first_idx] = True
+        return first & ~self.seen_mask(user_id, sensor_id, timestamps)
+
+    def add(self, user_id, sensor_id, timestamps):
+        """Record keys as ingested; call after the write they guard has succeeded"""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        with self._lock:
+            sensors = self._sensors(user_id)
+            current = sensors.get(sensor_id)
+            sensors[sensor_id] = np.union1d(current, timestamps) if current is not None else np.unique(timestamps)
+
+    def save(self, user_id):
+        """
+        Persist one user's index atomically. Keys another process saved since
+        this one loaded the file are merged in first, so concurrent imports
+        for the same user never drop each other's keys.
+        """
+        if not self.root:
+            return
+        path = self._path(user_id)
+        with open(path + ".lock", "ab") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                on_disk = {}
+                if os.path.exists(path):
+                    with np.load(path) as data:
+                        on_disk = {name: data[name] for name in data.files}
+                with self._lock:
+                    sensors = self._sensors(user_id)
+                    for sensor_id, stored in on_disk.items():
+                        current = sensors.get(sensor_id)
+                        sensors[sensor_id] = np.union1d(current, stored) if current is not None else stored
+                    merged = dict(sensors)
+                tmp = f"{path}.{os.getpid()}.tmp.npz"
+                np.savez(tmp, **merged)
+                os.replace(tmp, path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def count(self, user_id):
+        with self._lock:
+            return sum(a.size for a in self._sensors(user_id).values())
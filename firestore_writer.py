@@ -0,0 +1,192 @@
+# ✅ Batched Firestore writes
+# -------------------------------------------------------
+# The pages used to call .add()/.set() once per record, one RPC each.
+# BatchedWriter queues writes for users/{id}/{collection} documents and
+# commits them as WriteBatches (up to FLUSH_SIZE operations per RPC), either
+# when the queue fills up or every FLUSH_INTERVAL seconds from a background
+# thread. Commits that hit contention or a transient server error are
+# retried with backoff, and anything still queued is flushed at exit.
+# A commit that failed with DeadlineExceeded or ServiceUnavailable may
+# already have been applied, so queued writes must be idempotent (no
+# Increment / ArrayUnion transforms; see daily_rollup's parts).
+
+import atexit
+import random
+import threading
+import time
+
+import daily_rollup
+
+try:
+    from google.api_core import exceptions as gexc
+    RETRYABLE = (
+        gexc.Aborted, gexc.DeadlineExceeded, gexc.ServiceUnavailable,
+        gexc.InternalServerError, gexc.ResourceExhausted,
+    )
+except ImportError:
+    RETRYABLE = ()
+
+try:
+    from google.cloud.firestore import SERVER_TIMESTAMP
+except ImportError:
+    SERVER_TIMESTAMP = None
+
+# Firestore accepts at most 500 writes per batch commit
+FLUSH_SIZE = 500
+FLUSH_INTERVAL = 2.0
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 0.2
+
+
+class BatchedWriter:
+    """Queue of set/update/delete operations committed in WriteBatches"""
+
+    def __init__(self, db, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL, max_retries=MAX_RETRIES):
+        if not 1 <= flush_size <= FLUSH_SIZE:
+            raise ValueError(f"flush_size must be between 1 and {FLUSH_SIZE}")
+        self.db = db
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._pending = []
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._closed = False
+        self.stats = {"writes": 0, "commits": 0, "retries": 0}
+        self._thread = None
+        if flush_interval:
+            self._thread = threading.Thread(target=self._run, name="firestore-writer", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def collection(self, user_id, name):
+        return self.db.collection("users").document(user_id).collection(name)
+
+    # ✅ Queueing
+    def _queue(self, op):
+        if self._closed:
+            raise RuntimeError("BatchedWriter is closed")
+        with self._lock:
+            self._pending.append(op)
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self.flush()
+
+    def add(self, user_id, collection, data):
+        """Like CollectionReference.add(): the document ID is generated client-side, so no RPC here"""
+        ref = self.collection(user_id, collection).document()
+        self._queue(("set", ref, data, False))
+        return ref.id
+
+    def set(self, user_id, collection, doc_id, data, merge=False):
+        ref = self.collection(user_id, collection).document(doc_id)
+        self._queue(("set", ref, data, merge))
+        return doc_id
+
+    def update(self, user_id, collection, doc_id, data):
+        self._queue(("update", self.collection(user_id, collection).document(doc_id), data, False))
+
+    def delete(self, user_id, collection, doc_id):
+        self._queue(("delete", self.collection(user_id, collection).document(doc_id), None, False))
+
+    def set_many(self, user_id, collection, records, id_key=None):
+        """Queue many documents at once; `id_key` picks the document ID from each record"""
+        for record in records:
+            if id_key is None:
+                self.add(user_id, collection, record)
+            else:
+                self.set(user_id, collection, str(record[id_key]), record)
+
+    # ✅ Committing
+    def _commit(self, ops):
+        batch = self.db.batch()
+        for kind, ref, data, merge in ops:
+            if kind == "set":
+                batch.set(ref, data, merge=merge)
+            elif kind == "update":
+                batch.update(ref, data)
+            else:
+                batch.delete(ref)
+        batch.commit()
+
+    def _commit_with_retry(self, ops):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._commit(ops)
+                return
+            except RETRYABLE:
+                if attempt == self.max_retries:
+                    raise
+                self.stats["retries"] += 1
+                # Full jitter keeps contending writers from retrying in lockstep
+                time.sleep(random.uniform(0, BACKOFF_SECONDS * 2 ** attempt))
+
+    def flush(self):
+        """Commit everything queued so far; returns the number of writes committed"""
+        with self._commit_lock:
+            with self._lock:
+                ops, self._pending = self._pending, []
+            done = 0
+            try:
+                for i in range(0, len(ops), self.flush_size):
+                    chunk = ops[i:i + self.flush_size]
+                    self._commit_with_retry(chunk)
+                    done += len(chunk)
+                    self.stats["commits"] += 1
+            finally:
+                if done < len(ops):
+                    # Put the uncommitted tail back in front of anything queued meanwhile
+                    with self._lock:
+                        self._pending[:0] = ops[done:]
+            self.stats["writes"] += done
+            return done
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print("❌ Batched Firestore flush failed, will retry:", e)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        """Stop the background flusher and commit whatever is left (also runs at exit)"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+
+# ✅ Record helpers for the app's collections (each also updates the daily rollup)
+def log_whoop(writer, user_id, date, strain, recovery, sleep_hours, timestamp=None):
+    """One whoop_logs document per day (keyed by date), so re-rendering a page overwrites instead of piling up"""
+    daily_rollup.record_whoop(writer, user_id, date, strain, recovery, sleep_hours)
+    return writer.set(user_id, "whoop_logs", str(date), {
+        "date": str(date),
+        "timestamp": timestamp or SERVER_TIMESTAMP,
+        "strain": strain,
+        "recovery": recovery,
+        "sleep_hours": sleep_hours,
+    })
+
+
+def log_glucose_day(writer, user_id, date, fasting, postmeal, timestamp=None):
+    daily_rollup.record_glucose_log(writer, user_id, date, fasting, postmeal)
+    return writer.set(user_id, "glucose_logs", str(date), {
+        "date": str(date),
+        "timestamp": timestamp or SERVER_TIMESTAMP,
+        "fasting": fasting,
+        "postmeal": postmeal,
+    })
+
+
+def save_meal_plan(writer, user_id, plan):
+    return writer.add(user_id, "meal_plans", plan)
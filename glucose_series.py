@@ -0,0 +1,131 @@
+# ✅ Compact array-backed glucose series
+# -------------------------------------------------------
+# Readings are held as two parallel arrays: int64 epoch seconds and uint16
+# mg/dL. That is 10 bytes per reading, so a year of 5-minute data (~105k
+# readings) is about 1 MB instead of tens of MB of {"time", "glucose"} dicts.
+# Slicing by index or by time range returns views, never copies.
+
+import numpy as np
+
+from glucose_engine import analyze_arrays, times_to_minutes
+
+
+class GlucoseSeries:
+    """Time-sorted CGM readings backed by int64 seconds and uint16 mg/dL arrays"""
+
+    __slots__ = ("times", "values")
+
+    def __init__(self, times, values):
+        times = np.asarray(times, dtype=np.int64)
+        values = np.asarray(values)
+        if times.shape != values.shape or times.ndim != 1:
+            raise ValueError("times and values must be 1-D arrays of the same length")
+        if values.dtype != np.uint16:
+            values = values.astype(np.float64)
+            finite = np.isfinite(values)
+            if not finite.all():
+                # Gaps (NaN) are missing readings, not 0 mg/dL
+                times, values = times[finite], values[finite]
+            values = np.clip(np.rint(values), 0, np.iinfo(np.uint16).max).astype(np.uint16)
+        if times.size > 1 and np.any(times[1:] < times[:-1]):
+            order = np.argsort(times, kind="stable")
+            times, values = times[order], values[order]
+        self.times = times
+        self.values = values
+
+    # ✅ Constructors
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint16))
+
+    @classmethod
+    def from_numpy(cls, times, values):
+        return cls(times, values)
+
+    @classmethod
+    def from_readings(cls, readings, base_epoch=0):
+        """
+        From [{"time", "glucose"}] dicts. ISO timestamps are used as-is; HH:MM
+        clock times are offset from `base_epoch` (midnight of the first day).
+        """
+        labels = [r["time"] for r in readings]
+        if labels and all(len(t.strip()) <= 5 for t in labels):
+            seconds = base_epoch + times_to_minutes(labels) * 60
+        else:
+            seconds = np.array([t.strip().rstrip("Z") for t in labels], dtype="datetime64[s]").astype(np.int64)
+        values = np.fromiter((r["glucose"] for r in readings), dtype=np.float64, count=len(readings))
+        return cls(seconds, values)
+
+    @classmethod
+    def from_pandas(cls, series):
+        """From a pandas Series of mg/dL indexed by a DatetimeIndex"""
+        index = series.index
+        if getattr(index, "tz", None) is not None:
+            index = index.tz_convert("UTC").tz_localize(None)
+        seconds = index.to_numpy(dtype="datetime64[s]").astype(np.int64)
+        return cls(seconds, series.to_numpy(dtype=np.float64))
+
+    # ✅ Conversions
+    def to_numpy(self):
+        """(times, values) views of the underlying arrays"""
+        return self.times, self.values
+
+    def to_pandas(self):
+        import pandas as pd
+
+        index = pd.DatetimeIndex(self.times.astype("datetime64[s]"), name="time")
+        return pd.Series(self.values, index=index, name="glucose")
+
+    def to_readings(self):
+        stamps = np.datetime_as_string(self.times.astype("datetime64[s]"), unit="s")
+        return [{"time": f"{t}Z", "glucose": int(v)} for t, v in zip(stamps.tolist(), self.values.tolist())]
+
+    @property
+    def minutes(self):
+        return self.times // 60
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes
+
+    # ✅ Slicing
+    def __len__(self):
+        return self.times.size
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("GlucoseSeries only supports slice indexing")
+        return GlucoseSeries._view(self.times[key], self.values[key])
+
+    @classmethod
+    def _view(cls, times, values):
+        # Skip validation: slices of a sorted series are already sorted
+        series = cls.__new__(cls)
+        series.times = times
+        series.values = values
+        return series
+
+    def between(self, start, end):
+        """Readings with start <= time < end (epoch seconds), as a view"""
+        lo = np.searchsorted(self.times, start, side="left")
+        hi = np.searchsorted(self.times, end, side="left")
+        return self[lo:hi]
+
+    def append(self, other):
+        """New series with `other`'s readings merged in"""
+        return GlucoseSeries(
+            np.concatenate((self.times, other.times)),
+            np.concatenate((self.values, other.values)),
+        )
+
+    def __repr__(self):
+        if not len(self):
+            return "GlucoseSeries(empty)"
+        first, last = np.datetime_as_string(self.times[[0, -1]].astype("datetime64[s]"), unit="m")
+        return f"GlucoseSeries({len(self)} readings, {first} → {last})"
+
+
+def analyze_series(series, bodyweight_kg, goal="maintain", meals=None):
+    """Run the /analyze engine directly on a GlucoseSeries (no dict round-trip)"""
+    labels = np.char.add(np.datetime_as_string(series.times.astype("datetime64[s]"), unit="s"), "Z").tolist()
+    return analyze_arrays(labels, series.minutes, series.values.astype(np.float64), bodyweight_kg, goal, meals)
@@ -0,0 +1,210 @@
+# ✅ Streaming NDJSON ingestion with incremental statistics
+# -------------------------------------------------------
+# Multi-week exports are uploaded as newline-delimited readings, e.g.
+#   {"time": "2025-05-01T08:00:00Z", "glucose": 95}
+# optionally gzip-compressed. Bytes are decoded chunk by chunk and folded into
+# running statistics, so the full body is never held in memory. Gzip input
+# is inflated in slices of at most MAX_LINE_BYTES, so a small, highly
+# compressed chunk can't expand into a huge buffer. Spikes and lows are
+# counted in full, but only the first MAX_LISTED_EVENTS of each are listed.
+
+import json
+import zlib
+
+import numpy as np
+
+from glucose_engine import (
+    HIGH_THRESHOLD,
+    LOW_THRESHOLD,
+    SPIKE_DELTA,
+    SPIKE_WINDOW_MINUTES,
+    build_recommendation,
+    compute_macros,
+    times_to_minutes,
+)
+from spike_detector import SpikeTracker
+
+# A single reading line should never get close to this
+MAX_LINE_BYTES = 64 * 1024
+# Spike / low entries kept for the response; the counts cover everything
+MAX_LISTED_EVENTS = 1000
+
+
+class StreamingGlucoseStats:
+    """Running TIR, mean/variance, min/max and spike/low state over chunks of readings"""
+
+    def __init__(self):
+        self.count = 0
+        self.in_range = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.last_minute = None
+        # Same spike rule as /analyze; the tracker carries the window across chunks
+        self.tracker = SpikeTracker(SPIKE_DELTA, SPIKE_WINDOW_MINUTES)
+        self.spikes = []
+        self.lows = []
+        self.spike_count = 0
+        self.low_count = 0
+
+    def update(self, times, glucose):
+        """Fold one chronological chunk (list of time labels, float array) into the totals"""
+        n = glucose.size
+        if n == 0:
+            return
+
+        # Chan et al. parallel merge of (count, mean, M2)
+        chunk_mean = float(glucose.mean())
+        chunk_m2 = float(((glucose - chunk_mean) ** 2).sum())
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+        self.in_range += int(np.count_nonzero((glucose >= LOW_THRESHOLD) & (glucose <= HIGH_THRESHOLD)))
+        chunk_min, chunk_max = float(glucose.min()), float(glucose.max())
+        self.min = chunk_min if self.min is None else min(self.min, chunk_min)
+        self.max = chunk_max if self.max is None else max(self.max, chunk_max)
+
+        push = self.tracker.push
+        for minute, value, label in zip(self._minutes(times).tolist(), glucose.tolist(), times):
+            episode = push(minute, value, label)
+            if episode is not None:
+                self.spike_count += 1
+                if len(self.spikes) < MAX_LISTED_EVENTS:
+                    self.spikes.append(_spike(episode))
+        low_idx = np.flatnonzero(glucose < LOW_THRESHOLD)
+        self.low_count += low_idx.size
+        for i in low_idx[:MAX_LISTED_EVENTS - len(self.lows)].tolist():
+            self.lows.append({"time": times[i], "value": int(glucose[i])})
+
+    def _minutes(self, times):
+        """Reading times as minutes, continuing the previous chunk's clock"""
+        minutes = times_to_minutes(times)
+        if self.last_minute is not None and len(times[0].strip()) <= 5:
+            # HH:MM clock times: a step backwards across the boundary starts a new day
+            day = self.last_minute // 1440 + (minutes[0] < self.last_minute % 1440)
+            minutes = minutes + day * 1440
+        self.last_minute = int(minutes[-1])
+        return minutes
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def tir(self):
+        return round(self.in_range / self.count * 100, 1) if self.count else 0.0
+
+    def _listed_spikes(self):
+        """Listed spikes plus one still rising or elevated at the end of the stream, and the total count"""
+        episode = self.tracker.open_episode
+        if episode is None:
+            return self.spikes, self.spike_count
+        listed = self.spikes + [_spike(episode)] if len(self.spikes) < MAX_LISTED_EVENTS else self.spikes
+        return listed, self.spike_count + 1
+
+    def summary(self, bodyweight_kg=None, goal="maintain"):
+        """Result in the same shape as /analyze, plus the running statistics"""
+        spikes, n_spikes = self._listed_spikes()
+        result = {
+            "count": self.count,
+            "tir": self.tir,
+            "mean": round(self.mean, 2),
+            "variance": round(self.variance, 2),
+            "std": round(self.variance ** 0.5, 2),
+            "min": self.min,
+            "max": self.max,
+            "spikes": spikes,
+            "lows": self.lows,
+            "spike_count": n_spikes,
+            "low_count": self.low_count,
+        }
+        if bodyweight_kg is not None:
+            result["macros"] = compute_macros(bodyweight_kg, goal, self.tir, n_spikes, self.low_count)
+            result["recommendation"] = build_recommendation(self.tir, n_spikes, self.low_count)
+        return result
+
+
+def _spike(episode):
+    """A tracker episode as an /analyze spike entry"""
+    start, peak, end = episode
+    return {"from": start[2], "to": peak[2], "end": end[2], "delta": int(peak[1] - start[1])}
+
+
+class NDJSONReadingDecoder:
+    """Turns arbitrary byte chunks (optionally gzip) into (times, glucose) batches"""
+
+    def __init__(self, gzipped=False):
+        # 16 + MAX_WBITS tells zlib to expect a gzip header
+        self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+        self._pending = b""
+
+    def feed(self, chunk):
+        """Decode one chunk; yields a (times, glucose) batch per slice of complete lines"""
+        if self._inflater is None:
+            yield self._lines(chunk)
+            return
+        data = self._inflater.decompress(chunk, MAX_LINE_BYTES)
+        while True:
+            yield self._lines(data)
+            tail = self._inflater.unconsumed_tail
+            if not tail:
+                return
+            data = self._inflater.decompress(tail, MAX_LINE_BYTES)
+
+    def _lines(self, data):
+        data = self._pending + data
+        cut = data.rfind(b"\n")
+        if cut < 0:
+            self._pending = data
+            if len(data) > MAX_LINE_BYTES:
+                raise ValueError("NDJSON line exceeds maximum length")
+            return self._parse(b"")
+        self._pending = data[cut + 1:]
+        if len(self._pending) > MAX_LINE_BYTES:
+            raise ValueError("NDJSON line exceeds maximum length")
+        return self._parse(data[:cut])
+
+    def close(self):
+        """Flush the trailing line (no final newline required)"""
+        if self._inflater is not None:
+            # feed() drained all input, so zlib holds at most one window of output here
+            rest = self._inflater.flush()
+            if rest:
+                yield self._lines(rest)
+        tail = self._pending
+        self._pending = b""
+        yield self._parse(tail)
+
+    @staticmethod
+    def _parse(block):
+        lines = [line for line in block.split(b"\n") if line.strip()]
+        if not lines:
+            return [], np.empty(0, dtype=np.float64)
+        # One json.loads call per batch instead of one per line
+        try:
+            records = json.loads(b"[" + b",".join(lines) + b"]")
+            times = [r["time"] for r in records]
+            glucose = np.array([r["glucose"] for r in records], dtype=np.float64)
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            raise ValueError(f"Malformed NDJSON reading: {e}")
+        for t in times:
+            if not isinstance(t, str):
+                raise ValueError(f"Malformed NDJSON reading: time must be a string, got {t!r}")
+        return times, glucose
+
+
+async def ingest_ndjson_stream(byte_chunks, gzipped=False):
+    """Consume an async iterator of bytes and return the populated stats"""
+    decoder = NDJSONReadingDecoder(gzipped=gzipped)
+    stats = StreamingGlucoseStats()
+    async for chunk in byte_chunks:
+        if chunk:
+            for batch in decoder.feed(chunk):
+                stats.update(*batch)
+    for batch in decoder.close():
+        stats.update(*batch)
+    return stats
@@ -0,0 +1,167 @@
+# ✅ Consensus glycemic-variability metrics
+# -------------------------------------------------------
+# GMI, CV, MAGE, CONGA-n, MODD, LBGI/HBGI, J-index and the consensus
+# time-in-band percentages, computed with NumPy along the last axis.
+# A single user is a 1-D array; many users are a 2-D (users x samples)
+# array padded with NaN. Readings are assumed to sit on a fixed grid of
+# `sample_minutes` (gaps as NaN), which is what CONGA and MODD need.
+
+import math
+
+import numpy as np
+
+# (name, low, high) in mg/dL: below `high`, above `low`, or inclusive between both
+BANDS = [
+    ("tbr_54", None, 54),
+    ("tbr_70", None, 70),
+    ("tir_70_180", 70, 180),
+    ("tar_180", 180, None),
+    ("tar_250", 250, None),
+]
+
+
+def _lagged_diff(values, lag):
+    """g(t) - g(t - lag) along the last axis, NaN where either side is missing"""
+    if lag < 1 or lag >= values.shape[-1]:
+        return np.full(values.shape[:-1] + (0,), np.nan)
+    return values[..., lag:] - values[..., :-lag]
+
+
+# NaN-aware mean/SD with the empty cases masked explicitly: np.nanmean/np.nanstd
+# warn on all-NaN rows, and silencing that with warnings.catch_warnings() is
+# process-wide and not thread-safe (np.errstate below is per thread)
+def _nanmean(values, axis=-1):
+    valid = ~np.isnan(values)
+    n = np.count_nonzero(valid, axis=axis)
+    total = np.where(valid, values, 0.0).sum(axis=axis)
+    return np.where(n > 0, total / np.maximum(n, 1), np.nan)
+
+
+def _nanstd(values, axis=-1):
+    """Sample SD (ddof=1) over non-NaN entries; NaN with fewer than two"""
+    valid = ~np.isnan(values)
+    n = np.count_nonzero(valid, axis=axis)
+    deviation = np.where(valid, values - np.expand_dims(_nanmean(values, axis), axis), 0.0)
+    variance = (deviation ** 2).sum(axis=axis) / np.maximum(n - 1, 1)
+    return np.where(n > 1, np.sqrt(variance), np.nan)
+
+
+def _mage_row(row, sd):
+    """
+    Mean amplitude of glycemic excursions larger than one SD. Turning points
+    only count once glucose has moved at least one SD back from them, so
+    small sensor wiggles inside a large excursion don't split it.
+    """
+    row = row[~np.isnan(row)]
+    if row.size < 3 or not np.isfinite(sd) or sd == 0:
+        return np.nan
+    # Drop flat steps so every remaining step has a direction
+    steps = np.diff(row)
+    keep = np.concatenate(([True], steps != 0))
+    row = row[keep]
+    if row.size < 3:
+        return np.nan
+    direction = np.sign(np.diff(row))
+    turns = np.flatnonzero(direction[1:] != direction[:-1]) + 1
+    extrema = row[np.concatenate(([0], turns, [row.size - 1]))].tolist()
+
+    # Walk the local extrema, keeping a peak/nadir only once the next
+    # swing away from it is at least one SD
+    pivots = []
+    lo = hi = extrema[0]
+    trend = 0
+    for v in extrema[1:]:
+        if trend == 0:
+            lo, hi = min(lo, v), max(hi, v)
+            if v - lo >= sd:
+                pivots, trend, candidate = [lo], 1, v
+            elif hi - v >= sd:
+                pivots, trend, candidate = [hi], -1, v
+        elif trend > 0:
+            if v > candidate:
+                candidate = v
+            elif candidate - v >= sd:
+                pivots.append(candidate)
+                trend, candidate = -1, v
+        else:
+            if v < candidate:
+                candidate = v
+            elif v - candidate >= sd:
+                pivots.append(candidate)
+                trend, candidate = 1, v
+    if trend == 0:
+        return np.nan
+    pivots.append(candidate)
+    amplitudes = np.abs(np.diff(pivots))
+    amplitudes = amplitudes[amplitudes > sd]
+    return float(amplitudes.mean()) if amplitudes.size else np.nan
+
+
+def compute_metrics_batch(values, sample_minutes=5, conga_hours=1):
+    """
+    Metrics for many users at once.
+    `values` is a 2-D (users x samples) array of mg/dL with NaN for missing readings.
+    Returns {metric_name: 1-D array with one entry per user}.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    valid = ~np.isnan(values)
+    n = np.count_nonzero(valid, axis=-1)
+
+    # All-NaN rows (users with no readings) are expected and come out as NaN
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = _nanmean(values)
+        sd = _nanstd(values)
+        out = {
+            "n": n,
+            "mean": mean,
+            "sd": sd,
+            "cv": sd / mean * 100,
+            "gmi": 3.31 + 0.02392 * mean,
+            "j_index": 0.001 * (mean + sd) ** 2,
+        }
+
+        for name, lo, hi in BANDS:
+            if lo is None:
+                mask = values < hi
+            elif hi is None:
+                mask = values > lo
+            else:
+                mask = (values >= lo) & (values <= hi)
+            in_band = np.count_nonzero(mask, axis=-1)
+            out[name] = np.where(n > 0, in_band / np.maximum(n, 1) * 100, np.nan)
+
+        # Kovatchev risk transform; NaN and non-positive readings contribute nothing
+        safe = np.where(valid & (values > 0), values, np.nan)
+        f = 1.509 * (np.log(safe) ** 1.084 - 5.381)
+        risk = 10 * f ** 2
+        lbgi = np.nansum(np.where(f < 0, risk, 0.0), axis=-1)
+        hbgi = np.nansum(np.where(f > 0, risk, 0.0), axis=-1)
+        out["lbgi"] = np.where(n > 0, lbgi / np.maximum(n, 1), np.nan)
+        out["hbgi"] = np.where(n > 0, hbgi / np.maximum(n, 1), np.nan)
+
+        conga_lag = int(round(conga_hours * 60 / sample_minutes))
+        out["conga"] = _nanstd(_lagged_diff(values, conga_lag))
+
+        modd_lag = int(round(1440 / sample_minutes))
+        out["modd"] = _nanmean(np.abs(_lagged_diff(values, modd_lag)))
+
+    out["mage"] = np.array([_mage_row(row, s) for row, s in zip(values, sd)])
+    return out
+
+
+def compute_metrics(values, sample_minutes=5, conga_hours=1):
+    """Metrics for one user's trace as a JSON-friendly dict (NaN becomes None)"""
+    batch = compute_metrics_batch(np.asarray(values, dtype=np.float64)[np.newaxis, :], sample_minutes, conga_hours)
+    return metrics_row(batch, 0)
+
+
+def metrics_row(batch, i, digits=2):
+    """Pull one user's metrics out of a batch result"""
+    row = {}
+    for name, column in batch.items():
+        value = float(column[i])
+        if name == "n":
+            row[name] = int(value)
+        else:
+            row[name] = None if math.isnan(value) else round(value, digits)
+    return row
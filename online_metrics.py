@@ -0,0 +1,142 @@
+# ✅ O(1)-per-reading metrics for live CGM feeds
+# -------------------------------------------------------
+# Each new 5-minute reading updates time-in-range, Welford mean/std, CV and
+# the current spike/low state in constant time (amortized). Spikes use the
+# same windowed SpikeTracker as /analyze. The whole state is a plain dict, so
+# it can be checkpointed to Firestore and restored on another worker.
+
+from glucose_engine import HIGH_THRESHOLD, LOW_THRESHOLD, SPIKE_DELTA, SPIKE_WINDOW_MINUTES
+from spike_detector import SpikeTracker
+
+
+class OnlineGlucoseMetrics:
+    """Incremental glucose statistics for one user's live sensor stream"""
+
+    __slots__ = (
+        "count", "in_range", "mean", "m2", "min", "max",
+        "last_timestamp", "last_value",
+        "spike_tracker", "spike_count",
+        "in_low", "low_count",
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.in_range = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.last_timestamp = None
+        self.last_value = None
+        self.spike_tracker = SpikeTracker(SPIKE_DELTA, SPIKE_WINDOW_MINUTES)
+        self.spike_count = 0
+        self.in_low = False
+        self.low_count = 0
+
+    def add(self, timestamp, glucose):
+        """
+        Fold in one reading (epoch seconds, mg/dL).
+        Returns False for stale or duplicate readings, which are ignored.
+        """
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return False
+
+        glucose = float(glucose)
+        self.count += 1
+        delta = glucose - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (glucose - self.mean)
+
+        if LOW_THRESHOLD <= glucose <= HIGH_THRESHOLD:
+            self.in_range += 1
+        self.min = glucose if self.min is None else min(self.min, glucose)
+        self.max = glucose if self.max is None else max(self.max, glucose)
+
+        # A spike is a rise of SPIKE_DELTA within SPIKE_WINDOW_MINUTES, lasting until
+        # glucose falls back under nadir + SPIKE_DELTA; counted when it starts
+        was_in_spike = self.in_spike
+        self.spike_tracker.push(timestamp / 60, glucose, timestamp)
+        if self.in_spike and not was_in_spike:
+            self.spike_count += 1
+
+        is_low = glucose < LOW_THRESHOLD
+        if is_low and not self.in_low:
+            self.low_count += 1
+        self.in_low = is_low
+
+        self.last_timestamp = timestamp
+        self.last_value = glucose
+        return True
+
+    def extend(self, timestamps, values):
+        for t, v in zip(timestamps, values):
+            self.add(t, v)
+
+    @property
+    def in_spike(self):
+        return self.spike_tracker.open_episode is not None
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return self.variance ** 0.5
+
+    @property
+    def cv(self):
+        """Coefficient of variation in percent"""
+        return self.std / self.mean * 100 if self.mean else 0.0
+
+    @property
+    def tir(self):
+        return self.in_range / self.count * 100 if self.count else 0.0
+
+    def snapshot(self):
+        """Rounded values for display / API responses"""
+        return {
+            "count": self.count,
+            "tir": round(self.tir, 1),
+            "mean": round(self.mean, 1),
+            "std": round(self.std, 1),
+            "cv": round(self.cv, 1),
+            "min": self.min,
+            "max": self.max,
+            "last_value": self.last_value,
+            "in_spike": self.in_spike,
+            "spike_count": self.spike_count,
+            "in_low": self.in_low,
+            "low_count": self.low_count,
+        }
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["spike_tracker"] = self.spike_tracker.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        metrics = cls()
+        for name in cls.__slots__:
+            if name in data:
+                setattr(metrics, name, data[name])
+        if isinstance(data.get("spike_tracker"), dict):
+            metrics.spike_tracker = SpikeTracker.from_dict(data["spike_tracker"])
+        else:
+            # Checkpoints from before windowed spikes start a fresh window
+            metrics.spike_tracker = SpikeTracker(SPIKE_DELTA, SPIKE_WINDOW_MINUTES)
+        return metrics
+
+
+def save_live_metrics(db, user_id, metrics):
+    """Checkpoint to users/{id}/live_metrics/cgm"""
+    db.collection("users").document(user_id).collection("live_metrics").document("cgm").set(metrics.to_dict())
+
+
+def load_live_metrics(db, user_id):
+    """Restore a checkpoint, or start fresh if none exists"""
+    doc = db.collection("users").document(user_id).collection("live_metrics").document("cgm").get()
+    if not doc.exists:
+        return OnlineGlucoseMetrics()
+    return OnlineGlucoseMetrics.from_dict(doc.to_dict())
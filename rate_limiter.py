@@ -0,0 +1,115 @@
+# ✅ Token-bucket rate limiter shared across worker processes
+# -------------------------------------------------------
+# WHOOP enforces per-app limits, so every uvicorn / Streamlit worker on the
+# box draws from one bucket. The bucket state (tokens, last refill, and a
+# "blocked until" time set from Retry-After) lives in a 24-byte file that
+# is updated under an exclusive flock. The critical section is a read,
+# some arithmetic and a write.
+# Two priority lanes:
+#   - INTERACTIVE (page loads) may drain the bucket
+#   - BACKGROUND (syncs, backfills) leaves `reserve` tokens for interactive
+#     requests, and within a process also waits while an interactive
+#     request is queued
+
+import asyncio
+import fcntl
+import os
+import struct
+import time
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_STATE = struct.Struct("<ddd")
+
+
+class RateLimitWait(Exception):
+    """The next token is further away than the caller is willing to wait"""
+
+    def __init__(self, wait):
+        super().__init__(f"rate limited for another {wait:.0f}s")
+        self.wait = wait
+
+
+class FileTokenBucket:
+    def __init__(self, path, rate_per_second, capacity, reserve=0.0, clock=time.time):
+        if not 0 <= reserve < capacity:
+            raise ValueError("reserve must be below capacity")
+        self.path = path
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.reserve = reserve
+        self._clock = clock
+        # Per event loop: [interactive requests queued, Event set while none are]
+        self._gates = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _try_take(self, priority):
+        """Take one token if allowed; returns 0.0 on success or the seconds to wait"""
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            now = self._clock()
+            raw = os.pread(self._fd, _STATE.size, 0)
+            if len(raw) == _STATE.size:
+                tokens, updated, blocked_until = _STATE.unpack(raw)
+            else:
+                tokens, updated, blocked_until = float(self.capacity), now, 0.0
+            if blocked_until > now:
+                return blocked_until - now
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            floor = 1.0 + (self.reserve if priority == BACKGROUND else 0.0)
+            if tokens >= floor:
+                tokens -= 1.0
+                wait = 0.0
+            else:
+                wait = (floor - tokens) / self.rate
+            os.pwrite(self._fd, _STATE.pack(tokens, now, blocked_until), 0)
+            return wait
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def block_for(self, seconds):
+        """Pause every worker (e.g. after a 429 with Retry-After)"""
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            now = self._clock()
+            raw = os.pread(self._fd, _STATE.size, 0)
+            tokens, updated, blocked_until = _STATE.unpack(raw) if len(raw) == _STATE.size else (0.0, now, 0.0)
+            # Whatever was left is stale once the server says slow down
+            os.pwrite(self._fd, _STATE.pack(0.0, now, max(blocked_until, now + seconds)), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _gate(self):
+        loop = asyncio.get_running_loop()
+        gate = self._gates.get(loop)
+        if gate is None:
+            idle = asyncio.Event()
+            idle.set()
+            gate = self._gates[loop] = [0, idle]
+        return gate
+
+    async def acquire(self, priority=INTERACTIVE, max_wait=None):
+        """Wait for a token in the given lane; raises RateLimitWait if a single wait would exceed `max_wait`"""
+        gate = self._gate()
+        if priority == INTERACTIVE:
+            gate[0] += 1
+            gate[1].clear()
+        try:
+            while True:
+                if priority == BACKGROUND:
+                    await gate[1].wait()
+                wait = self._try_take(priority)
+                if wait <= 0:
+                    return
+                if max_wait is not None and wait > max_wait:
+                    raise RateLimitWait(wait)
+                await asyncio.sleep(wait)
+        finally:
+            if priority == INTERACTIVE:
+                gate[0] -= 1
+                if not gate[0]:
+                    gate[1].set()
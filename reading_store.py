@@ -0,0 +1,160 @@
+# ✅ Memory-mapped per-user reading store
+# -------------------------------------------------------
+# One file per user of fixed-width little-endian records (int64 epoch
+# seconds, uint16 mg/dL; 10 bytes each), kept in time order. Newer readings
+# are appended in place. A batch that reaches back before the last stored
+# reading (an older export imported later) is merged, and the file is
+# rewritten and atomically replaced. Reads memory-map the file and
+# binary-search the timestamp column, so a 90-day range is a zero-copy
+# slice instead of hundreds of Firestore reads. Each mapping holds a file
+# descriptor, so at most MAX_OPEN_MAPS users stay mapped (least recently
+# read evicted first). An evicted map is unmapped, and its descriptor closed,
+# once the last view returned from it is gone.
+
+import fcntl
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+import numpy as np
+
+from glucose_series import GlucoseSeries
+
+STORE_DIR = os.getenv("READING_STORE_DIR", "reading_store")
+RECORD = np.dtype([("t", "<i8"), ("g", "<u2")])
+MAX_OPEN_MAPS = int(os.getenv("READING_STORE_MAX_MAPS", "256"))
+
+
+class ReadingStore:
+    """Sorted, memory-mapped (timestamp, value) files, one per user"""
+
+    def __init__(self, root=STORE_DIR, max_open_maps=MAX_OPEN_MAPS):
+        self.root = root
+        self.max_open_maps = max_open_maps
+        os.makedirs(root, exist_ok=True)
+        self._maps = OrderedDict()
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def path(self, user_id):
+        return os.path.join(self.root, quote(user_id, safe="") + ".cgm")
+
+    def _lock(self, user_id):
+        with self._guard:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def _records(self, user_id):
+        """Memory-mapped records, re-mapped only when the file has grown or been replaced"""
+        path = self.path(user_id)
+        try:
+            st = os.stat(path)
+            key = (st.st_ino, st.st_size // RECORD.itemsize)
+        except FileNotFoundError:
+            key = (None, 0)
+        with self._guard:
+            cached = self._maps.get(user_id)
+            if cached is not None and cached[0] == key:
+                self._maps.move_to_end(user_id)
+                return cached[1]
+        if key[1] == 0:
+            records = np.empty(0, dtype=RECORD)
+        else:
+            records = np.memmap(path, dtype=RECORD, mode="r", shape=(key[1],))
+        with self._guard:
+            self._maps[user_id] = (key, records)
+            self._maps.move_to_end(user_id)
+            while len(self._maps) > self.max_open_maps:
+                # Dropping the last reference unmaps the file and closes its descriptor
+                self._maps.popitem(last=False)
+        return records
+
+    def append(self, user_id, times, values):
+        """
+        Durably store readings (epoch seconds, mg/dL). Readings newer than the
+        last stored one are appended; older ones are merged into place. A
+        timestamp that is already stored keeps its existing reading.
+        Returns the timestamps that were written (sorted).
+        """
+        new = GlucoseSeries(times, values)
+        # Collapse duplicates within the batch itself
+        keep = np.concatenate(([True], new.times[1:] != new.times[:-1])) if len(new) else np.empty(0, dtype=bool)
+        block = np.empty(int(keep.sum()), dtype=RECORD)
+        block["t"] = new.times[keep]
+        block["g"] = new.values[keep]
+        path = self.path(user_id)
+        with self._lock(user_id):
+            # Writers lock a sidecar file: a merge replaces the data file itself
+            with open(path + ".lock", "ab") as lock:
+                # Other processes may be writing the same user
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    with open(path, "ab+") as f:
+                        size = f.seek(0, os.SEEK_END)
+                        torn = size % RECORD.itemsize
+                        if torn:
+                            # Drop a half-written record left by a crash
+                            f.truncate(size - torn)
+                            size -= torn
+                        if size and block.size:
+                            f.seek(size - RECORD.itemsize)
+                            last = np.frombuffer(f.read(RECORD.itemsize), dtype=RECORD)["t"][0]
+                            if block["t"][0] <= last:
+                                return self._merge(path, f, block)
+                        if not block.size:
+                            return block["t"]
+                        f.seek(0, os.SEEK_END)
+                        f.write(block.tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                        return block["t"]
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _merge(self, path, f, block):
+        """Rewrite the file with `block` merged in (caller holds the write lock)"""
+        f.seek(0)
+        stored = np.fromfile(f, dtype=RECORD)
+        pos = np.searchsorted(stored["t"], block["t"])
+        present = pos < stored.size
+        present[present] = stored["t"][pos[present]] == block["t"][present]
+        block = block[~present]
+        if not block.size:
+            return block["t"]
+        merged = np.concatenate((stored, block))
+        merged = merged[np.argsort(merged["t"], kind="stable")]
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as out:
+            out.write(merged.tobytes())
+            out.flush()
+            os.fsync(out.fileno())
+        # Readers keep their mapping of the old file until they next look
+        os.replace(tmp, path)
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        return block["t"]
+
+    def read_range(self, user_id, start=None, end=None):
+        """Readings with start <= t < end as a GlucoseSeries view over the mapped file"""
+        records = self._records(user_id)
+        stamps = records["t"]
+        lo = 0 if start is None else int(np.searchsorted(stamps, start, side="left"))
+        hi = stamps.size if end is None else int(np.searchsorted(stamps, end, side="left"))
+        return GlucoseSeries._view(stamps[lo:hi], records["g"][lo:hi])
+
+    def read_days(self, user_id, days, now=None):
+        """The most recent `days` of readings"""
+        records = self._records(user_id)
+        if now is None:
+            now = int(records["t"][-1]) + 1 if records.size else 0
+        return self.read_range(user_id, now - days * 86400, now)
+
+    def last_timestamp(self, user_id):
+        records = self._records(user_id)
+        return int(records["t"][-1]) if records.size else None
+
+    def count(self, user_id):
+        return self._records(user_id).size
@@ -0,0 +1,424 @@
+# ✅ Storage repository: users, tokens, logs and meal plans
+# -------------------------------------------------------
+# The app only talks to storage through this interface, so the backend is a
+# deployment choice (STORAGE_BACKEND env var):
+#   - "firestore": the hosted Firestore layout the app has always used
+#       users/{id}, users/{id}/{provider}_auth/token,
+#       users/{id}/{whoop_logs|glucose_logs|meal_plans}/{doc}
+#   - "sqlite": one embedded database file in WAL mode, for single-node and
+#     on-prem deployments with no external database
+# Records are plain dicts. Logs and meal plans are listed newest first.
+# WHOOP records (cycles, recoveries, sleeps, workouts) are upserted by their
+# WHOOP id, next to a per-user sync cursor for each kind.
+
+import json
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+import uuid
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "nutriai.db")
+
+LOG_KINDS = ("whoop_logs", "glucose_logs")
+WHOOP_KINDS = ("cycle", "recovery", "sleep", "workout")
+
+
+class Repository(ABC):
+    """Storage interface shared by every backend"""
+
+    # Users
+    @abstractmethod
+    def get_user(self, username):
+        """User document dict, or None"""
+
+    @abstractmethod
+    def create_user(self, user_data):
+        """Insert a new user; returns False if the username is taken"""
+
+    @abstractmethod
+    def update_user(self, username, fields):
+        ...
+
+    # OAuth tokens
+    @abstractmethod
+    def get_token(self, user_id, provider="whoop"):
+        ...
+
+    @abstractmethod
+    def set_token(self, user_id, token, provider="whoop"):
+        ...
+
+    # Logs (whoop_logs / glucose_logs)
+    @abstractmethod
+    def put_log(self, user_id, kind, data, log_id=None):
+        """Insert or replace a log entry; returns its id (generated when not given)"""
+
+    @abstractmethod
+    def list_logs(self, user_id, kind, limit=7):
+        ...
+
+    # Meal plans
+    @abstractmethod
+    def add_meal_plan(self, user_id, plan):
+        ...
+
+    @abstractmethod
+    def list_meal_plans(self, user_id, limit=10):
+        ...
+
+    # WHOOP records and sync cursors
+    @abstractmethod
+    def upsert_whoop_records(self, user_id, kind, records):
+        """Insert or update records keyed by whoop_record_id(); returns how many were written"""
+
+    @abstractmethod
+    def list_whoop_records(self, user_id, kind, start=None, end=None, limit=None):
+        """Records with start <= record start < end (ISO strings), newest first"""
+
+    @abstractmethod
+    def get_sync_cursor(self, user_id, kind):
+        ...
+
+    @abstractmethod
+    def set_sync_cursor(self, user_id, kind, cursor):
+        ...
+
+
+def _check_kind(kind):
+    if kind not in LOG_KINDS:
+        raise ValueError(f"Unknown log kind: {kind}")
+
+
+def _check_whoop_kind(kind):
+    if kind not in WHOOP_KINDS:
+        raise ValueError(f"Unknown WHOOP record kind: {kind}")
+
+
+def whoop_record_id(kind, record):
+    """Recoveries have no id of their own; they are identified by their cycle"""
+    return str(record["cycle_id"] if kind == "recovery" else record["id"])
+
+
+def _record_start(kind, record):
+    # Recoveries carry no start time; created_at tracks their cycle closely
+    return record.get("start") or record.get("created_at") or ""
+
+
+# ✅ Firestore backend
+class FirestoreRepository(Repository):
+    def __init__(self, db):
+        self.db = db
+        self.users = db.collection("users")
+
+    def get_user(self, username):
+        doc = self.users.document(username).get()
+        return doc.to_dict() if doc.exists else None
+
+    def create_user(self, user_data):
+        from google.api_core.exceptions import Conflict
+
+        try:
+            # create() fails if the document exists, so a racing signup can't overwrite it
+            self.users.document(user_data["username"]).create(user_data)
+        except Conflict:
+            return False
+        return True
+
+    def update_user(self, username, fields):
+        self.users.document(username).update(fields)
+
+    def _token_doc(self, user_id, provider):
+        return self.users.document(user_id).collection(f"{provider}_auth").document("token")
+
+    def get_token(self, user_id, provider="whoop"):
+        doc = self._token_doc(user_id, provider).get()
+        return doc.to_dict() if doc.exists else None
+
+    def set_token(self, user_id, token, provider="whoop"):
+        self._token_doc(user_id, provider).set(token)
+
+    def put_log(self, user_id, kind, data, log_id=None):
+        _check_kind(kind)
+        ref = self.users.document(user_id).collection(kind)
+        doc = ref.document(log_id) if log_id else ref.document()
+        doc.set(data)
+        return doc.id
+
+    def _newest(self, user_id, collection, limit):
+        query = self.users.document(user_id).collection(collection).order_by("timestamp", direction="DESCENDING").limit(limit)
+        return [{"id": d.id, **d.to_dict()} for d in query.stream()]
+
+    def list_logs(self, user_id, kind, limit=7):
+        _check_kind(kind)
+        return self._newest(user_id, kind, limit)
+
+    def add_meal_plan(self, user_id, plan):
+        return self.users.document(user_id).collection("meal_plans").add(plan)[1].id
+
+    def list_meal_plans(self, user_id, limit=10):
+        return self._newest(user_id, "meal_plans", limit)
+
+    def upsert_whoop_records(self, user_id, kind, records):
+        _check_whoop_kind(kind)
+        ref = self.users.document(user_id).collection(f"whoop_{kind}")
+        for i in range(0, len(records), 500):
+            chunk = {}
+            for record in records[i:i + 500]:
+                rid = whoop_record_id(kind, record)
+                if rid not in chunk or (record.get("updated_at") or "") >= (chunk[rid].get("updated_at") or ""):
+                    chunk[rid] = record
+            self._upsert_newer(ref, kind, chunk)
+        return len(records)
+
+    def _upsert_newer(self, ref, kind, chunk):
+        """Write each record unless the stored copy has a newer updated_at (same rule as SQLite)"""
+        from google.cloud import firestore
+
+        docs = {rid: ref.document(rid) for rid in chunk}
+
+        @firestore.transactional
+        def write(transaction):
+            stored = {d.id: d.to_dict() for d in self.db.get_all(list(docs.values()), transaction=transaction) if d.exists}
+            for rid, record in chunk.items():
+                # ISO-8601 UTC strings compare chronologically; never let an older copy win
+                if rid in stored and (record.get("updated_at") or "") < (stored[rid].get("updated_at") or ""):
+                    continue
+                transaction.set(docs[rid], {**record, "_start": _record_start(kind, record)})
+
+        write(self.db.transaction())
+
+    def list_whoop_records(self, user_id, kind, start=None, end=None, limit=None):
+        _check_whoop_kind(kind)
+        query = self.users.document(user_id).collection(f"whoop_{kind}")
+        if start is not None:
+            query = query.where("_start", ">=", start)
+        if end is not None:
+            query = query.where("_start", "<", end)
+        query = query.order_by("_start", direction="DESCENDING")
+        if limit is not None:
+            query = query.limit(limit)
+        return [{k: v for k, v in d.to_dict().items() if k != "_start"} for d in query.stream()]
+
+    def _cursor_doc(self, user_id, kind):
+        return self.users.document(user_id).collection("whoop_sync").document(kind)
+
+    def get_sync_cursor(self, user_id, kind):
+        doc = self._cursor_doc(user_id, kind).get()
+        return doc.to_dict() if doc.exists else None
+
+    def set_sync_cursor(self, user_id, kind, cursor):
+        self._cursor_doc(user_id, kind).set(cursor)
+
+
+# ✅ SQLite backend
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    data     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    user_id  TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    data     TEXT NOT NULL,
+    PRIMARY KEY (user_id, provider)
+);
+CREATE TABLE IF NOT EXISTS logs (
+    user_id TEXT NOT NULL,
+    kind    TEXT NOT NULL,
+    id      TEXT NOT NULL,
+    ts      REAL NOT NULL,
+    data    TEXT NOT NULL,
+    PRIMARY KEY (user_id, kind, id)
+);
+CREATE INDEX IF NOT EXISTS logs_by_time ON logs (user_id, kind, ts DESC);
+CREATE TABLE IF NOT EXISTS meal_plans (
+    user_id TEXT NOT NULL,
+    id      TEXT NOT NULL,
+    ts      REAL NOT NULL,
+    data    TEXT NOT NULL,
+    PRIMARY KEY (user_id, id)
+);
+CREATE INDEX IF NOT EXISTS meal_plans_by_time ON meal_plans (user_id, ts DESC);
+CREATE TABLE IF NOT EXISTS whoop_records (
+    user_id    TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    id         TEXT NOT NULL,
+    start      TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data       TEXT NOT NULL,
+    PRIMARY KEY (user_id, kind, id)
+);
+CREATE INDEX IF NOT EXISTS whoop_records_by_start ON whoop_records (user_id, kind, start DESC);
+CREATE TABLE IF NOT EXISTS sync_cursors (
+    user_id TEXT NOT NULL,
+    kind    TEXT NOT NULL,
+    data    TEXT NOT NULL,
+    PRIMARY KEY (user_id, kind)
+);
+"""
+
+
+def _timestamp(data):
+    """Sort key for a record: its "timestamp" (epoch, datetime or ISO string), else now"""
+    ts = data.get("timestamp")
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if hasattr(ts, "timestamp"):
+        return ts.timestamp()
+    if isinstance(ts, str):
+        from datetime import datetime
+
+        try:
+            return datetime.fromisoformat(ts).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+def _dumps(data):
+    # Firestore sentinels (SERVER_TIMESTAMP) and datetimes have no JSON form
+    return json.dumps({k: v for k, v in data.items() if type(v).__name__ != "Sentinel"}, default=str)
+
+
+class SQLiteRepository(Repository):
+    """
+    WAL-mode SQLite file. Each thread gets its own connection; statements use
+    fixed SQL text with bound parameters, so sqlite3's per-connection
+    statement cache reuses the prepared statements.
+    """
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL makes NORMAL durable against application crashes and much cheaper than FULL
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def get_user(self, username):
+        row = self._conn().execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create_user(self, user_data):
+        try:
+            self._conn().execute("INSERT INTO users (username, data) VALUES (?, ?)", (user_data["username"], _dumps(user_data)))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def update_user(self, username, fields):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            current = self.get_user(username)
+            if current is None:
+                raise KeyError(username)
+            current.update(fields)
+            conn.execute("UPDATE users SET data = ? WHERE username = ?", (_dumps(current), username))
+
+    def get_token(self, user_id, provider="whoop"):
+        row = self._conn().execute(
+            "SELECT data FROM tokens WHERE user_id = ? AND provider = ?", (user_id, provider)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_token(self, user_id, token, provider="whoop"):
+        self._conn().execute(
+            "INSERT INTO tokens (user_id, provider, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id, provider) DO UPDATE SET data = excluded.data",
+            (user_id, provider, _dumps(token)),
+        )
+
+    def put_log(self, user_id, kind, data, log_id=None):
+        _check_kind(kind)
+        log_id = log_id or uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO logs (user_id, kind, id, ts, data) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, kind, id) DO UPDATE SET ts = excluded.ts, data = excluded.data",
+            (user_id, kind, log_id, _timestamp(data), _dumps(data)),
+        )
+        return log_id
+
+    def list_logs(self, user_id, kind, limit=7):
+        _check_kind(kind)
+        rows = self._conn().execute(
+            "SELECT id, data FROM logs WHERE user_id = ? AND kind = ? ORDER BY ts DESC LIMIT ?",
+            (user_id, kind, limit),
+        ).fetchall()
+        return [{"id": i, **json.loads(d)} for i, d in rows]
+
+    def add_meal_plan(self, user_id, plan):
+        plan_id = uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO meal_plans (user_id, id, ts, data) VALUES (?, ?, ?, ?)",
+            (user_id, plan_id, _timestamp(plan), _dumps(plan)),
+        )
+        return plan_id
+
+    def list_meal_plans(self, user_id, limit=10):
+        rows = self._conn().execute(
+            "SELECT id, data FROM meal_plans WHERE user_id = ? ORDER BY ts DESC LIMIT ?", (user_id, limit)
+        ).fetchall()
+        return [{"id": i, **json.loads(d)} for i, d in rows]
+
+    def upsert_whoop_records(self, user_id, kind, records):
+        _check_whoop_kind(kind)
+        rows = [
+            (user_id, kind, whoop_record_id(kind, r), _record_start(kind, r), r.get("updated_at") or "", json.dumps(r))
+            for r in records
+        ]
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            # ISO-8601 UTC strings compare chronologically; never let an older copy win
+            conn.executemany(
+                "INSERT INTO whoop_records (user_id, kind, id, start, updated_at, data) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, kind, id) DO UPDATE SET start = excluded.start, "
+                "updated_at = excluded.updated_at, data = excluded.data "
+                "WHERE excluded.updated_at >= whoop_records.updated_at",
+                rows,
+            )
+        return len(rows)
+
+    def list_whoop_records(self, user_id, kind, start=None, end=None, limit=None):
+        _check_whoop_kind(kind)
+        rows = self._conn().execute(
+            "SELECT data FROM whoop_records WHERE user_id = ? AND kind = ? AND start >= ? AND start < ? "
+            "ORDER BY start DESC LIMIT ?",
+            (user_id, kind, start or "", end or "\uffff", -1 if limit is None else limit),
+        ).fetchall()
+        return [json.loads(d) for (d,) in rows]
+
+    def get_sync_cursor(self, user_id, kind):
+        row = self._conn().execute(
+            "SELECT data FROM sync_cursors WHERE user_id = ? AND kind = ?", (user_id, kind)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_sync_cursor(self, user_id, kind, cursor):
+        self._conn().execute(
+            "INSERT INTO sync_cursors (user_id, kind, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id, kind) DO UPDATE SET data = excluded.data",
+            (user_id, kind, json.dumps(cursor)),
+        )
+
+
+def open_repository(backend=STORAGE_BACKEND, db=None, path=SQLITE_PATH):
+    """Repository for the configured backend (`db` is the Firestore client for "firestore")"""
+    if backend == "sqlite":
+        return SQLiteRepository(path)
+    if backend == "firestore":
+        return FirestoreRepository(db) if db is not None else None
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
@@ -0,0 +1,30 @@
+import numpy as np
+
+from cgm_resample import resample_many, resample_to_grid
+
+
+def test_last_reading_in_upper_half_of_step_is_kept():
+    result = resample_to_grid([0, 4, 8], [100, 100, 250])
+    np.testing.assert_allclose(result["values"], [100, 100, 250])
+    assert result["wear_pct"] == 100.0
+
+
+def test_irregular_timestamps():
+    times = [1, 4.5, 11, 12.4, 23, 61]
+    values = [100, 110, 120, 130, 140, 150]
+    result = resample_to_grid(times, values)
+    # Slots 0..12; 1 -> 0, 4.5 -> 1, 11 and 12.4 share slot 2, 23 -> 5, 61 -> 12
+    assert result["values"].size == 13
+    assert np.flatnonzero(result["observed"]).tolist() == [0, 1, 2, 5, 12]
+    assert result["values"][2] == 125
+    # 2..5 is a 15-minute gap (filled), 5..12 is 35 minutes (left missing)
+    assert result["interpolated"] == 2
+    assert result["missing"] == 6
+    assert result["values"][-1] == 150
+
+
+def test_many_keeps_each_users_last_reading():
+    _, _, matrix, wear = resample_many({"a": ([0, 4, 8], [100, 100, 250]), "b": ([0, 5], [90, 95])})
+    assert matrix.shape == (2, 3)
+    assert matrix[0, -1] == 250
+    assert wear.tolist() == [100.0, 100.0]
@@ -0,0 +1,10 @@
+from dedup_index import DedupIndex
+
+
+def test_saves_from_two_indexes_keep_each_others_keys(tmp_path):
+    first, second = DedupIndex(str(tmp_path)), DedupIndex(str(tmp_path))
+    first.add("u", "dexcom", [1, 2, 3])
+    second.add("u", "dexcom", [4, 5])
+    first.save("u")
+    second.save("u")
+    assert DedupIndex(str(tmp_path)).seen_mask("u", "dexcom", [1, 2, 3, 4, 5]).all()
@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+
+from glucose_series import GlucoseSeries
+
+
+def test_gaps_are_dropped_not_stored_as_zero():
+    index = pd.date_range("2024-03-01", periods=3, freq="5min")
+    series = GlucoseSeries.from_pandas(pd.Series([100.0, np.nan, 120.0], index=index))
+    assert series.values.tolist() == [100, 120]
+    assert (series.times[1] - series.times[0]) == 600
+
+
+def test_non_finite_numpy_values_are_dropped():
+    series = GlucoseSeries([0, 60, 120], [np.inf, 95.4, -np.inf])
+    assert series.times.tolist() == [60]
+    assert series.values.tolist() == [95]
@@ -0,0 +1,16 @@
+import asyncio
+
+import pytest
+
+from glucose_stream import ingest_ndjson_stream
+
+
+async def _chunks(body):
+    yield body
+
+
+@pytest.mark.parametrize("time", [b"5", b"null", b"[1]"])
+def test_non_string_time_is_a_value_error(time):
+    body = b'{"time": "08:00", "glucose": 100}\n{"time": ' + time + b', "glucose": 110}\n'
+    with pytest.raises(ValueError, match="time must be a string"):
+        asyncio.run(ingest_ndjson_stream(_chunks(body)))
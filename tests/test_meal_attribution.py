@@ -0,0 +1,38 @@
+from glucose_engine import analyze_readings
+
+
+def _overnight_trace():
+    # 22:00-02:00 every 5 minutes, flat at 100 with a rise after a 00:30 snack
+    readings = []
+    for i in range(49):
+        minute = (22 * 60 + 5 * i) % 1440
+        after = 5 * i - 150
+        glucose = 100 + (min(after, 45) * 2 if after > 0 else 0)
+        readings.append({"time": f"{minute // 60:02d}:{minute % 60:02d}", "glucose": glucose})
+    return readings
+
+
+def test_clock_meal_after_midnight_is_placed_on_the_trace():
+    result = analyze_readings(_overnight_trace(), 75, meals=[{"time": "00:30", "description": "snack"}])
+    (meal,) = result["meals"]
+    assert meal["peak_delta"] == 90
+    assert meal["iauc"] is not None
+    assert result["spikes"] and result["spikes"][0]["meal"] == "snack"
+
+
+def test_meals_outside_the_trace_are_dropped():
+    meals = [{"time": "12:00", "description": "lunch"}, {"time": "23:00", "description": "late"}]
+    result = analyze_readings(_overnight_trace(), 75, meals=meals)
+    assert [m["description"] for m in result["meals"]] == ["late"]
+
+
+def test_timestamped_meals_on_a_timestamped_trace():
+    readings = [
+        {"time": f"2024-03-0{1 + (22 * 60 + 5 * i) // 1440}T{(22 * 60 + 5 * i) % 1440 // 60:02d}:{(5 * i) % 60:02d}",
+         "glucose": r["glucose"]}
+        for i, r in enumerate(_overnight_trace())
+    ]
+    meals = [{"time": "2024-03-02T00:30", "description": "snack"}, {"time": "2024-03-01T00:30", "description": "old"}]
+    result = analyze_readings(readings, 75, meals=meals)
+    assert [m["description"] for m in result["meals"]] == ["snack"]
+    assert result["spikes"][0]["meal"] == "snack"
@@ -0,0 +1,36 @@
+import asyncio
+import json
+
+from glucose_engine import analyze_readings
+from glucose_stream import ingest_ndjson_stream
+from online_metrics import OnlineGlucoseMetrics
+
+VALUES = [100, 105, 110, 120, 130, 135, 130, 125, 110, 100, 98, 96, 130, 140, 150, 90]
+# Five-minute readings from 23:00, so the trace crosses midnight
+READINGS = [
+    {"time": f"{(1380 + i * 5) // 60 % 24:02d}:{(1380 + i * 5) % 60:02d}", "glucose": v}
+    for i, v in enumerate(VALUES)
+]
+
+
+def test_stream_reports_the_same_spikes_as_analyze():
+    lines = [json.dumps(r).encode() + b"\n" for r in READINGS]
+
+    async def chunks():
+        for i in range(0, len(lines), 3):
+            yield b"".join(lines[i:i + 3])
+
+    streamed = asyncio.run(ingest_ndjson_stream(chunks())).summary(80)
+    analyzed = analyze_readings(READINGS, 80)
+    assert streamed["spikes"] == analyzed["spikes"]
+    assert streamed["macros"] == analyzed["macros"]
+
+
+def test_live_metrics_count_the_same_spikes_across_a_checkpoint():
+    metrics = OnlineGlucoseMetrics()
+    for i, v in enumerate(VALUES[:13]):
+        metrics.add(1_700_000_000 + i * 300, v)
+    metrics = OnlineGlucoseMetrics.from_dict(metrics.to_dict())
+    for i, v in enumerate(VALUES[13:], 13):
+        metrics.add(1_700_000_000 + i * 300, v)
+    assert metrics.spike_count == len(analyze_readings(READINGS, 80)["spikes"])
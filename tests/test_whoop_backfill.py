@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import whoop_backfill
+from repository import SQLiteRepository
+from whoop_backfill import BackfillJob, plan_windows
+
+NOW = datetime(2026, 3, 14, 15, 9, 26, 535000, tzinfo=timezone.utc)
+
+
+def test_windows_do_not_depend_on_job_time():
+    first = plan_windows(NOW - timedelta(days=365), NOW)
+    later = plan_windows(NOW - timedelta(days=365), NOW + timedelta(hours=5, milliseconds=17))
+    assert first == later
+    assert first[0][0] <= "2026-03-14T15:09:26.535Z" < first[0][1]
+    assert first[-1][0] <= "2025-03-14T15:09:26.535Z"
+
+
+def test_interrupted_job_resumes(tmp_path, monkeypatch):
+    repo = SQLiteRepository(str(tmp_path / "backfill.db"))
+    fetched = []
+    fail_before = {"value": "2025-09-01"}
+
+    async def fake_fetch_pages(token, kind, start, end=None, on_page=None, **kwargs):
+        if start < fail_before["value"]:
+            raise RuntimeError("connection lost")
+        fetched.append((kind, start))
+        await on_page([{"id": f"{kind}-{start}", "start": start, "updated_at": start}], None)
+        return 1
+
+    monkeypatch.setattr(whoop_backfill, "fetch_pages", fake_fetch_pages)
+
+    first = BackfillJob("u1", kinds=("cycle", "sleep"), days=365, now=NOW)
+    with pytest.raises(RuntimeError):
+        asyncio.run(first.run(repo, "token"))
+    finished = len(fetched)
+    assert 0 < finished < first.total
+
+    # A fresh job a few hours later (as the app builds on each click) skips the finished windows
+    fetched.clear()
+    fail_before["value"] = ""
+    second = BackfillJob("u1", kinds=("cycle", "sleep"), days=365, now=NOW + timedelta(hours=3))
+    result = asyncio.run(second.run(repo, "token"))
+    open_windows = len(second.kinds)
+    assert result["skipped"] == finished - open_windows
+    assert len(fetched) == second.total - result["skipped"]
+    assert result["done"] == second.total
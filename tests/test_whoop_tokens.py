@@ -0,0 +1,15 @@
+from whoop_tokens import sign_state, verify_state
+
+
+def test_signed_state_round_trips_the_user():
+    state = sign_state("secret", "jane.doe@example.com", now=1000)
+    assert verify_state("secret", state, now=1100) == "jane.doe@example.com"
+
+
+def test_forged_or_expired_states_are_rejected():
+    state = sign_state("secret", "alice", now=1000)
+    user, rest = state.split(".", 1)
+    assert verify_state("secret", "mallory." + rest, now=1000) is None
+    assert verify_state("other-secret", state, now=1000) is None
+    assert verify_state("secret", state, now=1000 + 3600) is None
+    assert verify_state("secret", "whoop_oauth_state:alice") is None
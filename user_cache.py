@@ -0,0 +1,119 @@
+# ✅ Read-through TTL cache for user documents
+# -------------------------------------------------------
+# get_current_user runs on every authenticated request, and each call was a
+# Firestore round trip. UserCache keeps recently used user documents in
+# process for TTL_SECONDS, remembers missing users for a shorter
+# NEGATIVE_TTL_SECONDS, and evicts least-recently-used entries beyond
+# MAX_ENTRIES. FastAPI runs sync routes in a threadpool, so every access
+# goes through one lock. Concurrent misses for the same user share one
+# load, and a load that overlaps an invalidation is not cached.
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TTL_SECONDS = float(os.getenv("USER_CACHE_TTL", "60"))
+NEGATIVE_TTL_SECONDS = float(os.getenv("USER_CACHE_NEGATIVE_TTL", "10"))
+MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+_MISSING = object()
+
+
+class UserCache:
+    """LRU + TTL map of user_id -> user document dict (or None for a known-missing user)"""
+
+    def __init__(self, ttl=TTL_SECONDS, negative_ttl=NEGATIVE_TTL_SECONDS, max_entries=MAX_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._loading = {}
+        # In-flight loads only: bumped by writes so a stale load isn't cached
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, user_id):
+        """Cached document, None for a cached miss, or _MISSING (call with lock held)"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return _MISSING
+        expires, doc = entry
+        if expires <= self._clock():
+            del self._entries[user_id]
+            return _MISSING
+        self._entries.move_to_end(user_id)
+        return doc
+
+    def _store(self, user_id, doc):
+        """Insert an entry and enforce the size bound (call with lock held)"""
+        ttl = self.ttl if doc is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        self._entries[user_id] = (self._clock() + ttl, doc)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, user_id, loader):
+        """
+        User document for `user_id`, calling `loader(user_id)` on a miss.
+        The loader returns the document dict or None if the user doesn't exist.
+        Callers get a copy, so mutating the result never touches the cache.
+        """
+        while True:
+            with self._lock:
+                doc = self._lookup(user_id)
+                if doc is not _MISSING:
+                    self.hits += 1
+                    return copy.deepcopy(doc)
+                pending = self._loading.get(user_id)
+                if pending is None:
+                    pending = self._loading[user_id] = threading.Event()
+                    self._versions[user_id] = version = 0
+                    self.misses += 1
+                    break
+            # Another thread is already loading this user; wait and re-check
+            pending.wait()
+
+        try:
+            doc = loader(user_id)
+            with self._lock:
+                if self._versions.get(user_id) == version:
+                    self._store(user_id, copy.deepcopy(doc))
+            return doc
+        finally:
+            with self._lock:
+                self._loading.pop(user_id, None)
+                self._versions.pop(user_id, None)
+            pending.set()
+
+    def _bump(self, user_id):
+        """Mark an in-flight load as stale so its result is not cached (call with lock held)"""
+        if user_id in self._versions:
+            self._versions[user_id] += 1
+
+    def put(self, user_id, doc):
+        """Store a document the caller just wrote (write-through)"""
+        with self._lock:
+            self._bump(user_id)
+            self._store(user_id, copy.deepcopy(doc))
+
+    def invalidate(self, user_id=None):
+        """Forget one user (after a profile write) or everyone"""
+        with self._lock:
+            if user_id is None:
+                for key in self._versions:
+                    self._versions[key] += 1
+                self._entries.clear()
+            else:
+                self._bump(user_id)
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -0,0 +1,138 @@
+# ✅ Resumable, parallel WHOOP history backfill
+# -------------------------------------------------------
+# A new connection pulls the athlete's full history (BACKFILL_DAYS by
+# default) once. The range is cut into WINDOW_DAYS windows per record kind,
+# and up to CONCURRENCY windows are fetched at the same time, each following
+# its own pagination. Windows sit on a fixed grid of WINDOW_DAYS UTC days
+# counted from the epoch, so a job created later (a new click, a restart)
+# plans the same windows. Finished windows are checkpointed in the
+# sync-cursor table under "backfill:<kind>", and a job that was interrupted
+# (closed tab, restart, API error) skips them when it runs again. The newest
+# window is still open and is never checkpointed. Records are upserted by
+# WHOOP id, so re-fetching a half-finished window is harmless.
+# Requests use the BACKGROUND rate-limit lane, so page loads go first.
+
+import asyncio
+import concurrent.futures
+import threading
+from datetime import datetime, timedelta, timezone
+
+import whoop_client
+from rate_limiter import BACKGROUND
+from repository import WHOOP_KINDS
+from whoop_sync import _iso, fetch_pages
+
+BACKFILL_DAYS = 730
+WINDOW_DAYS = 30
+CONCURRENCY = 6
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def plan_windows(start, end, window_days=WINDOW_DAYS):
+    """[(start_iso, end_iso)] grid windows covering start..end, newest window first"""
+    step = timedelta(days=window_days)
+    # Round `end` up to the grid so window keys don't depend on the current time
+    hi = _EPOCH + step * -(-(end - _EPOCH) // step)
+    windows = []
+    while hi > start:
+        windows.append((_iso(hi - step), _iso(hi)))
+        hi -= step
+    return windows
+
+
+class BackfillJob:
+    """
+    Progress for one user's backfill. Counters are updated from the event
+    loop and read from the UI thread, so they are guarded by a lock.
+    """
+
+    def __init__(self, user_id, kinds=WHOOP_KINDS, days=BACKFILL_DAYS, window_days=WINDOW_DAYS,
+                 concurrency=CONCURRENCY, now=None):
+        self.user_id = user_id
+        self.kinds = tuple(kinds)
+        self.concurrency = concurrency
+        self.end = now or datetime.now(timezone.utc)
+        self.start = self.end - timedelta(days=days)
+        self.windows = plan_windows(self.start, self.end, window_days)
+        self.total = len(self.windows) * len(self.kinds)
+        self.done = 0
+        self.skipped = 0
+        self.records = 0
+        self._lock = threading.Lock()
+
+    def progress(self):
+        with self._lock:
+            return {"done": self.done, "total": self.total, "skipped": self.skipped, "records": self.records}
+
+    def _advance(self, records=0, skipped=False):
+        with self._lock:
+            self.done += 1
+            self.records += records
+            self.skipped += skipped
+
+    async def run(self, repo, token):
+        """Fetch every unfinished (kind, window); returns the final progress dict"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        checkpoints = {}
+        checkpoint_locks = {kind: asyncio.Lock() for kind in self.kinds}
+        for kind in self.kinds:
+            saved = await asyncio.to_thread(repo.get_sync_cursor, self.user_id, f"backfill:{kind}") or {}
+            checkpoints[kind] = set(saved.get("done", []))
+
+        async def fetch_window(kind, window):
+            if window[0] in checkpoints[kind]:
+                self._advance(skipped=True)
+                return
+            async with semaphore:
+                stored = 0
+
+                async def on_page(records, next_token):
+                    nonlocal stored
+                    if records:
+                        await asyncio.to_thread(repo.upsert_whoop_records, self.user_id, kind, records)
+                        stored += len(records)
+
+                await fetch_pages(token, kind, window[0], end=window[1], on_page=on_page, priority=BACKGROUND)
+            if window[1] > _iso(self.end):
+                # Still collecting new records; the incremental sync covers it from here
+                self._advance(records=stored)
+                return
+            # Checkpoint writes for a kind are serialized so none is lost
+            async with checkpoint_locks[kind]:
+                checkpoints[kind].add(window[0])
+                await asyncio.to_thread(repo.set_sync_cursor, self.user_id, f"backfill:{kind}", {
+                    "done": sorted(checkpoints[kind]),
+                    "start": _iso(self.start),
+                    "updated_at": _iso(datetime.now(timezone.utc)),
+                })
+            self._advance(records=stored)
+
+        results = await asyncio.gather(
+            *(fetch_window(k, w) for k in self.kinds for w in self.windows), return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            # Finished windows are already checkpointed; the next run picks up the rest
+            raise errors[0]
+        return self.progress()
+
+
+def run_backfill_sync(repo, token, job, on_progress=None, poll_seconds=0.25):
+    """
+    Run a job on whoop_client's background loop from a Streamlit script.
+    `on_progress(progress_dict)` is called on the calling thread (where
+    Streamlit elements may be updated) while the job runs and once at the end.
+    """
+    future = asyncio.run_coroutine_threadsafe(job.run(repo, token), whoop_client._background_loop())
+    while True:
+        try:
+            result = future.result(timeout=poll_seconds)
+            break
+        except concurrent.futures.TimeoutError:
+            if on_progress is not None:
+                on_progress(job.progress())
+    if on_progress is not None:
+        on_progress(result)
+    return result
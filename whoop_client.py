@@ -0,0 +1,315 @@
+# ✅ WHOOP API client
+# -------------------------------------------------------
+# One pooled httpx.AsyncClient per event loop (keep-alive, HTTP/2 when the
+# h2 package is installed, explicit timeouts). fetch_summary() requests
+# cycles, recoveries and sleeps concurrently, so a dashboard load costs
+# one round trip instead of three sequential cold connections.
+# Every request first takes a token from a bucket shared by all workers on
+# the box (rate_limiter.py), so the app stays under WHOOP's per-app limit.
+# 429 and 5xx responses are retried with jittered exponential backoff, and
+# Retry-After is honoured by every worker. Page loads use the INTERACTIVE
+# lane, and syncs and backfills the BACKGROUND lane.
+#   - FastAPI / async code:  await fetch_summary(token)
+#   - Streamlit / sync code: fetch_summary_sync(token), which runs on a
+#     long-lived background loop so its connection pool survives reruns
+
+import asyncio
+import atexit
+import contextvars
+import importlib.util
+import os
+import random
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+from rate_limiter import INTERACTIVE, FileTokenBucket, RateLimitWait
+
+WHOOP_API_BASE = "https://api.prod.whoop.com/developer"
+TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+# WHOOP allows 100 requests per minute per app; keep a few tokens for page loads
+RATE_PER_MINUTE = float(os.getenv("WHOOP_RATE_PER_MINUTE", "100"))
+BURST = int(os.getenv("WHOOP_RATE_BURST", "10"))
+INTERACTIVE_RESERVE = 3
+RATE_STATE_PATH = os.getenv("WHOOP_RATE_STATE", os.path.join(tempfile.gettempdir(), "whoop_rate.bucket"))
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+# A longer Retry-After (or shared pause) fails an interactive request instead of stalling a page
+MAX_RETRY_AFTER = 60.0
+# How long a Streamlit call waits for run_sync(). Waits inside it (rate limiter, Retry-After,
+# backoff) stop early enough to leave one request's read timeout before this deadline.
+SYNC_TIMEOUT = 30.0
+
+ENDPOINTS = {
+    "cycles": "/v1/cycle",
+    "recovery": "/v1/recovery",
+    "sleep": "/v1/activity/sleep",
+}
+# Summary field filled from each endpoint
+FIELDS = {"cycles": "strain", "recovery": "recovery", "sleep": "sleep"}
+
+
+class WhoopAPIError(Exception):
+    def __init__(self, status_code, message=""):
+        super().__init__(f"WHOOP API returned {status_code}: {message}")
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class WhoopSummary:
+    """Latest scored values; a field is None when WHOOP had no scored record (see `errors`)"""
+
+    strain: Optional[float] = None
+    recovery: Optional[int] = None
+    sleep: Optional[float] = None
+    errors: dict = field(default_factory=dict)
+
+    @property
+    def complete(self):
+        return None not in (self.strain, self.recovery, self.sleep)
+
+    @property
+    def failed(self):
+        """Fields that are missing because their request or its parsing failed (not just unscored)"""
+        return [f for kind, f in FIELDS.items() if kind in self.errors and getattr(self, f) is None]
+
+    def to_dict(self, defaults=None):
+        """{"strain", "recovery", "sleep"} dict for the pages, filling gaps from `defaults`"""
+        values = {"strain": self.strain, "recovery": self.recovery, "sleep": self.sleep}
+        for k, v in (defaults or {}).items():
+            if values.get(k) is None:
+                values[k] = v
+        return values
+
+
+# ✅ Shared connection pools
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_http_client():
+    """The pooled AsyncClient for the running event loop (clients can't be shared across loops)"""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(base_url=WHOOP_API_BASE, http2=HTTP2, timeout=TIMEOUT, limits=LIMITS)
+            _clients[loop] = client
+    return client
+
+
+async def aclose():
+    """Close this loop's client (call from the FastAPI shutdown hook)"""
+    with _clients_lock:
+        client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+_limiter = None
+
+
+def get_limiter():
+    global _limiter
+    with _clients_lock:
+        if _limiter is None:
+            _limiter = FileTokenBucket(RATE_STATE_PATH, RATE_PER_MINUTE / 60, BURST, reserve=INTERACTIVE_RESERVE)
+    return _limiter
+
+
+# ✅ Record parsing
+def _latest_scored(records):
+    for record in records:
+        if record.get("score_state") == "SCORED" and record.get("score"):
+            return record["score"]
+    return None
+
+
+def _strain(score):
+    return round(score["strain"], 1)
+
+
+def _recovery(score):
+    return round(score["recovery_score"])
+
+
+def _sleep_hours(score):
+    stages = score["stage_summary"]
+    asleep_ms = stages["total_in_bed_time_milli"] - stages["total_awake_time_milli"]
+    return round(asleep_ms / 1000 / 60 / 60, 1)
+
+
+PARSERS = {"cycles": _strain, "recovery": _recovery, "sleep": _sleep_hours}
+
+
+# ✅ Requests
+def _retry_after(response):
+    """Retry-After in seconds (delta or HTTP date), or None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt):
+    # Full jitter: spreads retries from many workers over the whole interval
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+# Loop time by which waits must end, set by run_sync (copied into tasks created under it)
+_deadline = contextvars.ContextVar("whoop_deadline", default=None)
+
+
+def _wait_budget(limit):
+    """The longest a retry or rate-limit wait may take: `limit`, capped by the run_sync deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return limit
+    left = max(deadline - asyncio.get_running_loop().time(), 0.0)
+    return left if limit is None else min(limit, left)
+
+
+async def get_json(token, path, params=None, priority=INTERACTIVE):
+    """GET a WHOOP endpoint through the shared rate limiter, retrying 429 / 5xx / connection errors"""
+    limiter = get_limiter()
+    for attempt in range(MAX_RETRIES + 1):
+        # Background work waits out any pause; a page load gives up and says so
+        max_wait = _wait_budget(MAX_RETRY_AFTER if priority == INTERACTIVE else None)
+        try:
+            await limiter.acquire(priority, max_wait)
+        except RateLimitWait as e:
+            raise WhoopAPIError(429, f"WHOOP rate limit reached, retry in {e.wait:.0f}s")
+        try:
+            response = await get_http_client().get(path, params=params, headers={"Authorization": f"Bearer {token}"})
+        except httpx.TransportError:
+            backoff = _backoff(attempt)
+            if attempt == MAX_RETRIES or backoff > _wait_budget(backoff):
+                raise
+            await asyncio.sleep(backoff)
+            continue
+        status = response.status_code
+        if status == 200:
+            return response.json()
+        if status != 429 and status < 500:
+            raise WhoopAPIError(status, response.text[:200])
+        delay = _retry_after(response)
+        if status == 429 and delay is not None:
+            # Every worker pauses, not just this request
+            limiter.block_for(delay)
+        wait = delay if delay is not None else _backoff(attempt)
+        if attempt == MAX_RETRIES or wait > _wait_budget(MAX_RETRY_AFTER):
+            raise WhoopAPIError(status, response.text[:200])
+        await asyncio.sleep(wait)
+
+
+async def validate_token(token):
+    """False when WHOOP rejects the token; rate limits, outages and timeouts raise"""
+    try:
+        await get_json(token, "/v1/user/profile/basic")
+    except WhoopAPIError as e:
+        if e.status_code in (401, 403):
+            return False
+        raise
+    return True
+
+
+async def fetch_summary(token, days=7):
+    """Latest scored strain, recovery and sleep from the last `days` days, fetched concurrently"""
+    end = datetime.now(timezone.utc)
+    params = {
+        "start": (end - timedelta(days=days)).isoformat().replace("+00:00", "Z"),
+        "end": end.isoformat().replace("+00:00", "Z"),
+        "limit": 10,
+    }
+    kinds = list(ENDPOINTS)
+    responses = await asyncio.gather(
+        *(get_json(token, ENDPOINTS[k], params) for k in kinds), return_exceptions=True
+    )
+    records, errors = {}, {}
+    for kind, body in zip(kinds, responses):
+        if isinstance(body, Exception):
+            errors[kind] = str(body)
+        else:
+            records[kind] = body.get("records", [])
+    return summarize(records, errors)
+
+
+def summarize(records, errors=None):
+    """WhoopSummary from {"cycles" | "recovery" | "sleep": [records, newest first]}"""
+    values, errors = {}, dict(errors or {})
+    for kind, parse in PARSERS.items():
+        score = _latest_scored(records.get(kind, []))
+        if score is None:
+            continue
+        try:
+            values[kind] = parse(score)
+        except (KeyError, TypeError) as e:
+            errors[kind] = f"unexpected score format: {e!r}"
+    return WhoopSummary(values.get("cycles"), values.get("recovery"), values.get("sleep"), errors)
+
+
+# ✅ Sync entry points (Streamlit)
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="whoop-client", daemon=True).start()
+            atexit.register(_shutdown_loop)
+    return _loop
+
+
+def _shutdown_loop():
+    if _loop is not None and _loop.is_running():
+        asyncio.run_coroutine_threadsafe(aclose(), _loop).result(timeout=5)
+        _loop.call_soon_threadsafe(_loop.stop)
+
+
+async def _with_deadline(coro, timeout):
+    # Leave one request's read timeout after the last wait, so requests fail with a
+    # WhoopAPIError before wait_for has to cancel them
+    _deadline.set(asyncio.get_running_loop().time() + max(timeout - TIMEOUT.read, 0.0))
+    return await asyncio.wait_for(coro, timeout)
+
+
+def run_sync(coro, timeout=SYNC_TIMEOUT):
+    """
+    Run a coroutine on the shared background loop and wait for its result.
+    Its retries and rate-limit waits are bounded by `timeout`, and it is
+    cancelled (raising TimeoutError) if it still hasn't finished by then.
+    """
+    future = asyncio.run_coroutine_threadsafe(_with_deadline(coro, timeout), _background_loop())
+    try:
+        # The grace period lets wait_for's cancellation land before giving up on the future
+        return future.result(timeout=timeout + 1.0)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+
+def fetch_summary_sync(token, days=7):
+    return run_sync(fetch_summary(token, days))
+
+
+def validate_token_sync(token):
+    return run_sync(validate_token(token))
@@ -0,0 +1,127 @@
+# ✅ Incremental WHOOP sync
+# -------------------------------------------------------
+# Keeps a local copy of a user's cycles, recoveries, sleeps and workouts in
+# the storage repository, so pages read records locally instead of
+# re-downloading the last week on every view.
+# A cursor per (user, kind) remembers:
+#   - updated_at:    newest updated_at stored so far (the high-water mark)
+#   - latest_start:  newest record start stored so far
+#   - query_start / next_token: the collection query in progress, so an
+#                    interrupted sync resumes on the page where it stopped
+# WHOOP collections filter on record start time, not update time, so each
+# sync re-asks from latest_start minus RESCORE_LOOKBACK (records that were
+# still scoring can change) and only upserts records newer than the mark.
+# Pagination is followed to the end (response "next_token", request
+# "nextToken").
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import whoop_client
+from rate_limiter import INTERACTIVE
+from repository import WHOOP_KINDS
+
+ENDPOINTS = {
+    "cycle": "/v1/cycle",
+    "recovery": "/v1/recovery",
+    "sleep": "/v1/activity/sleep",
+    "workout": "/v1/activity/workout",
+}
+PAGE_LIMIT = 25
+RESCORE_LOOKBACK = timedelta(days=2)
+# How far back a user's first sync reaches (the backfill job covers full history)
+INITIAL_LOOKBACK = timedelta(days=30)
+
+
+def _iso(dt):
+    return dt.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _parse_iso(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+async def fetch_pages(token, kind, start, end=None, next_token=None, on_page=None, priority=INTERACTIVE):
+    """
+    Walk every page of a collection query. `on_page(records, next_token)` is
+    awaited after each page so callers can persist progress; returns the
+    total record count.
+    """
+    params = {"start": start, "limit": PAGE_LIMIT}
+    if end is not None:
+        params["end"] = end
+    total = 0
+    while True:
+        page_params = dict(params, nextToken=next_token) if next_token else params
+        body = await whoop_client.get_json(token, ENDPOINTS[kind], page_params, priority)
+        records = body.get("records", [])
+        next_token = body.get("next_token")
+        total += len(records)
+        if on_page is not None:
+            await on_page(records, next_token)
+        if not next_token:
+            return total
+
+
+async def sync_kind(repo, token, user_id, kind, now=None, priority=INTERACTIVE):
+    """Bring one kind up to date; returns the number of new or changed records stored"""
+    cursor = await asyncio.to_thread(repo.get_sync_cursor, user_id, kind) or {}
+    now = now or datetime.now(timezone.utc)
+    if cursor.get("next_token"):
+        # Resume the interrupted query with the parameters its token belongs to
+        query_start = cursor["query_start"]
+    elif cursor.get("latest_start"):
+        query_start = _iso(_parse_iso(cursor["latest_start"]) - RESCORE_LOOKBACK)
+    else:
+        query_start = _iso(now - INITIAL_LOOKBACK)
+
+    mark = cursor.get("updated_at", "")
+    state = {"updated_at": mark, "latest_start": cursor.get("latest_start", ""), "stored": 0}
+
+    async def on_page(records, next_token):
+        # Unchanged records from the lookback window cost nothing locally
+        changed = [r for r in records if (r.get("updated_at") or "") > mark]
+        if changed:
+            await asyncio.to_thread(repo.upsert_whoop_records, user_id, kind, changed)
+            state["stored"] += len(changed)
+        for r in records:
+            state["updated_at"] = max(state["updated_at"], r.get("updated_at") or "")
+            state["latest_start"] = max(state["latest_start"], r.get("start") or r.get("created_at") or "")
+        await asyncio.to_thread(repo.set_sync_cursor, user_id, kind, {
+            # Advance the high-water mark only once the whole query is done
+            "updated_at": mark if next_token else state["updated_at"],
+            "latest_start": state["latest_start"],
+            "query_start": query_start if next_token else None,
+            "next_token": next_token,
+            "synced_at": _iso(now),
+        })
+
+    try:
+        await fetch_pages(token, kind, query_start, next_token=cursor.get("next_token"), on_page=on_page, priority=priority)
+    except whoop_client.WhoopAPIError as e:
+        if not (cursor.get("next_token") and e.status_code == 400):
+            raise
+        # The saved page token has expired; rerun the same query from its first page
+        await fetch_pages(token, kind, query_start, on_page=on_page, priority=priority)
+    return state["stored"]
+
+
+async def sync_user(repo, token, user_id, kinds=WHOOP_KINDS, priority=INTERACTIVE):
+    """Sync every kind concurrently; returns {kind: records stored}"""
+    counts = await asyncio.gather(*(sync_kind(repo, token, user_id, k, priority=priority) for k in kinds))
+    return dict(zip(kinds, counts))
+
+
+def sync_user_sync(repo, token, user_id, kinds=WHOOP_KINDS, priority=INTERACTIVE):
+    return whoop_client.run_sync(sync_user(repo, token, user_id, kinds, priority))
+
+
+def latest_summary(repo, user_id, days=7, now=None):
+    """WhoopSummary built from locally stored records (no API calls)"""
+    now = now or datetime.now(timezone.utc)
+    start = _iso(now - timedelta(days=days))
+    return whoop_client.summarize({
+        "cycles": repo.list_whoop_records(user_id, "cycle", start=start),
+        "recovery": repo.list_whoop_records(user_id, "recovery", start=start),
+        "sleep": repo.list_whoop_records(user_id, "sleep", start=start),
+    })
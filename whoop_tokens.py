@@ -0,0 +1,236 @@
+# ✅ WHOOP OAuth token manager
+# -------------------------------------------------------
+# Access tokens are cached in memory until shortly before they expire, so a
+# WHOOP page view no longer reads users/{id}/whoop_auth/token or calls the
+# OAuth endpoint. Tokens that are in use are refreshed in the background
+# REFRESH_AHEAD_SECONDS before expiry. Concurrent refreshes for the same user
+# share one request. Because WHOOP rotates refresh tokens, the stored token
+# is re-read right before refreshing, in case another worker just did it.
+# Tokens are persisted through the storage repository (repository.py); the
+# OAuth code exchange goes through exchange_code() so it is cached right away.
+# The OAuth redirect starts a new session, so the `state` parameter carries
+# the user ID back, HMAC-signed with the client secret (sign_state /
+# verify_state) so a crafted callback can't store tokens under another user.
+
+import asyncio
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote, unquote
+
+import whoop_client
+
+WHOOP_TOKEN_URL = "https://api.prod.whoop.com/oauth/oauth2/token"
+# Refresh tokens in use this long before expiry, off the request path
+REFRESH_AHEAD_SECONDS = 300
+# Below this remaining lifetime a request waits for a refresh instead
+MIN_VALIDITY_SECONDS = 60
+# A signed OAuth state expires after this long (the user is on WHOOP's consent page meanwhile)
+STATE_MAX_AGE_SECONDS = 600
+
+
+class WhoopAuthError(Exception):
+    pass
+
+
+def _expires_at(token):
+    """Epoch expiry of a stored token ({access_token, refresh_token, expires_in, timestamp})"""
+    issued = token.get("timestamp")
+    if isinstance(issued, str):
+        issued = datetime.fromisoformat(issued)
+    if isinstance(issued, datetime):
+        if issued.tzinfo is None:
+            # The apps store naive utcnow() ISO strings
+            issued = issued.replace(tzinfo=timezone.utc)
+        issued = issued.timestamp()
+    if issued is None or token.get("expires_in") is None:
+        return 0.0
+    return float(issued) + int(token["expires_in"])
+
+
+def _state_mac(secret, payload):
+    return hmac.new(secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+
+def sign_state(secret, user_id, now=None):
+    """OAuth `state` naming the user the tokens belong to, as user.issued.nonce.mac"""
+    issued = int(time.time() if now is None else now)
+    payload = f"{quote(user_id, safe='')}.{issued}.{secrets.token_urlsafe(8)}"
+    return f"{payload}.{_state_mac(secret, payload)}"
+
+
+def verify_state(secret, state, max_age=STATE_MAX_AGE_SECONDS, now=None):
+    """The user ID from a state made by sign_state, or None if it is forged, malformed or expired"""
+    parts = state.rsplit(".", 3)
+    if len(parts) != 4 or not parts[1].isdigit():
+        return None
+    payload, mac = state[:-len(parts[3]) - 1], parts[3]
+    if not hmac.compare_digest(mac, _state_mac(secret, payload)):
+        return None
+    age = (time.time() if now is None else now) - int(parts[1])
+    if not 0 <= age <= max_age:
+        return None
+    return unquote(parts[0])
+
+
+class _Entry:
+    __slots__ = ("access_token", "expires_at", "last_used", "timer")
+
+    def __init__(self, access_token, expires_at):
+        self.access_token = access_token
+        self.expires_at = expires_at
+        self.last_used = 0.0
+        self.timer = None
+
+
+class WhoopTokenManager:
+    """In-memory, self-refreshing WHOOP access tokens backed by a Repository"""
+
+    def __init__(self, repo, client_id, client_secret, token_url=WHOOP_TOKEN_URL,
+                 refresh_ahead=REFRESH_AHEAD_SECONDS, min_validity=MIN_VALIDITY_SECONDS, clock=time.time):
+        self.repo = repo
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_url = token_url
+        self.refresh_ahead = refresh_ahead
+        self.min_validity = min_validity
+        self._clock = clock
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    # ✅ Hot path
+    async def get_access_token(self, user_id):
+        """A valid access token; only waits for I/O on first use or when a refresh is overdue"""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.expires_at - now > self.min_validity:
+                entry.last_used = now
+                return entry.access_token
+        entry = await self._load_or_refresh(user_id)
+        entry.last_used = self._clock()
+        return entry.access_token
+
+    def get_access_token_sync(self, user_id):
+        return whoop_client.run_sync(self.get_access_token(user_id))
+
+    def _token_record(self, token_response):
+        return {
+            "access_token": token_response["access_token"],
+            "refresh_token": token_response.get("refresh_token"),
+            "expires_in": token_response["expires_in"],
+            "timestamp": datetime.fromtimestamp(self._clock(), timezone.utc).replace(tzinfo=None).isoformat(),
+        }
+
+    def store(self, user_id, token_response):
+        """Persist a fresh token response (e.g. from the OAuth code exchange) and cache it"""
+        token = self._token_record(token_response)
+        self.repo.set_token(user_id, token)
+        return self._cache(user_id, token)
+
+    async def exchange_code(self, user_id, code, redirect_uri):
+        """Trade an OAuth authorization code for tokens and store them for `user_id`"""
+        response = await whoop_client.get_http_client().post(
+            self.token_url,
+            data={
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": redirect_uri,
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        if response.status_code != 200:
+            raise WhoopAuthError(f"Failed to exchange code ({response.status_code}): {response.text[:200]}")
+        token = self._token_record(response.json())
+        await asyncio.to_thread(self.repo.set_token, user_id, token)
+        return self._cache(user_id, token).access_token
+
+    def exchange_code_sync(self, user_id, code, redirect_uri):
+        return whoop_client.run_sync(self.exchange_code(user_id, code, redirect_uri))
+
+    def invalidate(self, user_id):
+        """Forget a user's token (disconnect, or a 401 from the API)"""
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+        if entry is not None and entry.timer is not None:
+            entry.timer.cancel()
+
+    # ✅ Refresh machinery
+    def _cache(self, user_id, token):
+        entry = _Entry(token["access_token"], _expires_at(token))
+        with self._lock:
+            old = self._entries.get(user_id)
+            if old is not None and old.timer is not None:
+                old.timer.cancel()
+            self._entries[user_id] = entry
+        self._schedule(user_id, entry)
+        return entry
+
+    def _schedule(self, user_id, entry):
+        """Arm a background refresh REFRESH_AHEAD_SECONDS before expiry (needs a running loop)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        delay = max(entry.expires_at - self.refresh_ahead - self._clock(), 0)
+        entry.timer = loop.call_later(delay, self._proactive_refresh, user_id, entry)
+
+    def _proactive_refresh(self, user_id, entry):
+        with self._lock:
+            current = self._entries.get(user_id)
+        # Only keep tokens warm for users active since this token was cached
+        if current is not entry or entry.last_used == 0.0:
+            return
+        task = asyncio.ensure_future(self._load_or_refresh(user_id, force=True))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _load_or_refresh(self, user_id, force=False):
+        """Single-flight per (event loop, user): concurrent callers await the same task"""
+        key = (asyncio.get_running_loop(), user_id)
+        with self._lock:
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._do_refresh(user_id, force))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _do_refresh(self, user_id, force):
+        # Blocking repository I/O runs off the event loop
+        stored = await asyncio.to_thread(self.repo.get_token, user_id)
+        if not stored or not stored.get("access_token"):
+            raise WhoopAuthError("No WHOOP token found for user.")
+        remaining = _expires_at(stored) - self._clock()
+        # A timer can fire a little early; treat "almost due" as due so it doesn't re-arm in a loop
+        if remaining > self.min_validity and not (force and remaining <= self.refresh_ahead + 30):
+            # Still valid, or another worker already refreshed it
+            return self._cache(user_id, stored)
+        if not stored.get("refresh_token"):
+            raise WhoopAuthError("Refresh token missing.")
+
+        response = await whoop_client.get_http_client().post(
+            self.token_url,
+            data={
+                "grant_type": "refresh_token",
+                "refresh_token": stored["refresh_token"],
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        if response.status_code != 200:
+            raise WhoopAuthError(f"Failed to refresh token ({response.status_code}): {response.text[:200]}")
+        new = response.json()
+        new.setdefault("refresh_token", stored["refresh_token"])
+        self.refreshes += 1
+        token = self._token_record(new)
+        await asyncio.to_thread(self.repo.set_token, user_id, token)
+        # Cache on the loop thread so the next background refresh gets scheduled
+        return self._cache(user_id, token)